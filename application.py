@@ -1,9 +1,13 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-from re import search
+from asyncio import get_running_loop
+from json import loads
+from sys import exc_info
+from time import monotonic
 
 from prompt_toolkit.application import Application as PromptApplication
+from prompt_toolkit.filters import Condition
 from prompt_toolkit.key_binding.defaults import load_key_bindings
 from prompt_toolkit.key_binding import (
     KeyBindings, merge_key_bindings)
@@ -12,30 +16,62 @@ from prompt_toolkit.layout.containers import HSplit, VSplit, Window
 from prompt_toolkit.styles import style_from_pygments_cls
 from prompt_toolkit.widgets import Frame
 
-from pygments.styles import get_style_by_name, get_all_styles
+from pygments.styles import get_style_by_name
 
 from argsnlocals import ArgsnLocalsWindow
 from breakpoints import BreakpointsWindow
 from callstack import CallstackWindow
 from console import ConsoleWindow
 from disassembly import DisassemblyWindow
+from latency import Latency
+from loopqueue import LoopQueue
 from registers import RegistersWindow
+from router import Router
 from source import SourceWindow
 from threads import ThreadsWindow
 
+# Records that build on the previous ones (breakpoint, disassembly,
+# callstack, register and thread deltas and the inferior they belong to).
+# They are applied even from superseded snapshots.
+DELTA_RECORDS = ['inferior', 'breakpoints', 'disassembly', 'disassembly-more',
+                 'callstack', 'callstack-more', 'registers', 'threads']
+
+# Times of stages, rather than durations, in a snapshot's times record.
+TIMESTAMPS = ['requested', 'started', 'sent', 'received', 'parsed']
+
 class Application:
-    def __init__(self):
+    def __init__(self, console=ConsoleWindow):
+        # console is the class of the gdb console pane; benchmarks/replay.py
+        # passes one without gdb.
         self.style_name = 'trac'
         self.frame = None
+        self.messages = LoopQueue(self._handle_messages)
+        # Durations of the stages from a stop to painting it.
+        self.latency = Latency()
+        self.painting = None
+        # Messages from gdbwhelper by type, the first word of the message.
+        # Called on the pipe's reader thread.
+        self.message_types = Router(self.latency, 'message:')
+        self.message_types.register('snapshot', self._handle_snapshot_message)
+        self.message_types.register('latency', self._handle_latency_message)
         self.argsnlocals = ArgsnLocalsWindow(app=self)
-        self.console = ConsoleWindow(app=self, callback = self._gdb_callback)
+        self.console = console(app=self, callback = self._gdb_callback)
         self.source = SourceWindow(self)
         self.breakpoints = BreakpointsWindow(self, show=False)
         self.callstack = CallstackWindow(self, show=False)
         self.disassembly = DisassemblyWindow(self, show=False)
         self.registers = RegistersWindow(self, show=False)
         self.threads = ThreadsWindow(self, show=False)
-        self.inferiors = ''
+        self.inferiors = 0
+        self.stop_seq = 0
+
+        # Records of a snapshot by key, to the handlers panes register.
+        self.router = Router(self.latency, 'pane:')
+        self.router.register('frame', self._handle_frame)
+        self.router.register('inferior', self._handle_inferior)
+        for pane in [self.argsnlocals, self.breakpoints, self.callstack,
+                     self.disassembly, self.registers, self.threads]:
+            pane.register(self.router)
 
 
         self.col1 = HSplit([self.source.get_ui(),
@@ -62,18 +98,53 @@ class Application:
                                      full_screen=True,
                                      mouse_support=True,
                                      key_bindings=kb)
-        
+        self.app.after_render += self._after_render
+        self._send_visibility()
 
     def run(self):
         self.log('*** Running application')
-        self.app.run()
+        self.app.run(pre_run=self._attach_loop)
+        self.messages.detach()
 
-    def log(self, msg):
-        self.console.log(msg)
+    def log_stats(self):
+        # Called by the console when gdb exits, before the log pipe closes.
+        self.log('*** Message handlers: %s', self.message_types.stats())
+        self.log('*** Record handlers: %s', self.router.stats())
+
+    def _attach_loop(self):
+        # Messages from gdb are applied on the event loop, in batches.
+        self.messages.attach(get_running_loop())
+
+    def log(self, msg, *args):
+        self.console.log(msg, *args)
 
     def has_breakpoint(self, loc):
         return self.breakpoints.has_breakpoint(loc)
 
+    def _panes(self):
+        return {
+            'source': self.source,
+            'disassembly': self.disassembly,
+            'argsnlocals': self.argsnlocals,
+            'registers': self.registers,
+            'callstack': self.callstack,
+            'threads': self.threads,
+            'breakpoints': self.breakpoints,
+        }
+
+    def _send_visibility(self):
+        # Let gdbwhelper skip commands for hidden panes.
+        shown = [name for (name, c) in self._panes().items() if c.show]
+        self.console.send(' '.join(['gdbw-show'] + shown))
+
+    def _layout_changed(self):
+        self._send_visibility()
+        self.app.invalidate()
+
+    def _toggle(self, c):
+        c.toggle_show()
+        self._layout_changed()
+
     def _hide_tui(self):
         def hide(c):
             if c.show:
@@ -85,7 +156,6 @@ class Application:
         hide(self.callstack)
         hide(self.threads)
         hide(self.breakpoints)
-        self.app.invalidate()
         
     def _get_key_bindings(self):
         kb = KeyBindings()
@@ -96,53 +166,66 @@ class Application:
         @kb.add('c-x', 'a', eager=True)
         def _(event):
             self._hide_tui()
-            self.app.invalidate()
+            self._layout_changed()
             
         @kb.add('c-x', '1', eager=True)
         def _(event):
             self._hide_tui()
             self.source.show = True
-            self.app.invalidate()
+            self._layout_changed()
             
         @kb.add('c-x', '2', eager=True)
         def _(event):
             self._hide_tui()
             self.source.show = True
             self.disassembly.show = True
+            self._layout_changed()
 
         @kb.add('c-x', 's', eager=True)
         def _(event):
-            self.source.toggle_show()
-            self.app.invalidate()
+            self._toggle(self.source)
             
         @kb.add('c-x', 'd', eager=True)
         def _(event):
-            self.disassembly.toggle_show()
-            self.app.invalidate()
+            self._toggle(self.disassembly)
             
         @kb.add('c-x', 'c', eager=True)
         def _(event):
-            self.callstack.toggle_show()
-            self.app.invalidate()
+            self._toggle(self.callstack)
             
         @kb.add('c-x', 'v', eager=True)
         def _(event):
-            self.argsnlocals.toggle_show()
-            self.app.invalidate()
+            self._toggle(self.argsnlocals)
             
         @kb.add('c-x', 'b', eager=True)
         def _(event):
-            self.breakpoints.toggle_show()
-            self.app.invalidate()
+            self._toggle(self.breakpoints)
             
         @kb.add('c-x', 'r', eager=True)
         def _(event):
-            self.registers.toggle_show()
-            self.app.invalidate()
+            self._toggle(self.registers)
             
         @kb.add('c-x', 't', eager=True)
         def _(event):
-            self.threads.toggle_show()
+            self._toggle(self.threads)
+
+        @kb.add('enter', filter=Condition(
+            lambda: self.argsnlocals.has_focus('args')))
+        def _(event):
+            self.argsnlocals.toggle_expand('args')
+
+        @kb.add('enter', filter=Condition(
+            lambda: self.argsnlocals.has_focus('locals')))
+        def _(event):
+            self.argsnlocals.toggle_expand('locals')
+
+        @kb.add('c-x', 'l', eager=True)
+        def _(event):
+            self.console.toggle_hud()
+
+        @kb.add('c-x', 'g', eager=True)
+        def _(event):
+            self.registers.next_group()
 
         @kb.add('c-s', eager=True)
         def _(event):
@@ -167,65 +250,130 @@ class Application:
         kb = merge_key_bindings([load_key_bindings(), kb])
         return kb
 
-    def _handle_info_inferiors(self, output):
-        m = search('process (\d+)', output)
-        if m and m[1] != self.inferiors:
+    def _handle_inferior(self, record):
+        pid = record['pid']
+        if pid and pid != self.inferiors:
             # Program (re)run
-            self.log('**match %s' % m[1])
-            self.inferiors = m[1]
+            self.log('**new process %d', pid)
+            self.inferiors = pid
             self.breakpoints.reset()
             self.source.reset()
             self.disassembly.reset()
             self.registers.reset()
+            self.argsnlocals.reset()
+            # The frame of this stop has been handled already; keep the
+            # values about to be shown for it, in a fresh table.
+            self.argsnlocals.handle_frame_change(self.frame)
             self.frame = None
 
-    def _handle_info_frame(self, output):
-        self.callstack.handle_info_frame(output)
-        m = search('frame at (0x.+):', output)
-        frame = m[1] if m else None
+    def _handle_frame(self, record):
+        self.callstack.handle_frame(record)
+        frame = (record['func'], record['addr']) if record else None
         changed = frame != self.frame
         self.frame = frame
         if changed:
-            self.argsnlocals.handle_frame_change()
-        self.source.handle_info_frame(output)
-        
-            
-    def _gdb_callback(self, response):
-        self.log('***Received \n%s' % response)
+            self.argsnlocals.handle_frame_change(frame)
+        self.source.handle_frame(record)
+
+    def _gdb_callback(self, payload):
+        # Called on the pipe's reader thread. Parse here, but leave the
+        # panes to the event loop. Only the header line is decoded to find
+        # the type of the message.
         try:
-            p = response.find('\n')
-            cmd = response[:p]
-            output = response[p+1:]
-            if cmd.startswith('info args'):
-                self.argsnlocals.handle_info_args(output)            
-            elif cmd.startswith('info locals'):
-                self.argsnlocals.handle_info_locals(output)
-
-            elif cmd.startswith('disassemble'):
-                self.disassembly.handle_disassemble(output)
-            elif cmd.startswith('info registers'):
-                self.registers.handle_info_registers(output)
-
-            elif cmd.startswith('info breakpoints'):
-                self.breakpoints.handle_info_breakpoints(output)
-                                
-            elif cmd.startswith('bt '):
-                self.callstack.handle_bt(output)
-
-                
-            elif cmd.startswith('info frame'):
-                self._handle_info_frame(output)
-                app.invalidate()
-            elif cmd.startswith('info inferiors'):
-                self._handle_info_inferiors(output)
-
-            elif cmd.startswith('info threads'):
-                self.threads.handle_info_threads(output)
+            head = bytes(payload[:64])
+            p = head.find(b'\n')
+            if p < 0:
+                p = len(payload)
+                head = bytes(payload)
+            (kind, _, args) = str(head[:p], 'utf-8', 'replace').partition(' ')
+            body = payload[p+1:]
+            if not self.message_types.dispatch(kind, args, body):
+                self._handle_other_message(payload)
         except:
-            self.log('***Exception %s' % (exec_info()[1]))
+            self.log('***Exception %s', exc_info()[1])
+
+    def _handle_snapshot_message(self, args, body):
+        received = monotonic()
+        snapshot = loads(bytes(body))
+        if 'times' in snapshot:
+            snapshot['times']['received'] = received
+            snapshot['times']['parsed'] = monotonic()
+        self.messages.put((int(args), snapshot))
+
+    def _handle_latency_message(self, args, body):
+        self.latency.dump(args)
+        self.log('*** Wrote latency stats to %s', args)
+
+    def _handle_other_message(self, payload):
+        # Responses to commands; only logged.
+        if self.console.gdbw_log_pipe:
+            self.log('***Received \n%s', str(payload, 'utf-8', 'replace'))
+
+    def _handle_messages(self, messages):
+        # Called on the event loop with the snapshots that arrived since the
+        # last call. Only the newest stop matters; repaint once.
+        latest = max(seq for (seq, snapshot) in messages)
+        for (seq, snapshot) in messages:
+            if seq < latest:
+                self.log('***Superseded snapshot %d; applying deltas', seq)
+                snapshot = dict((key, snapshot[key]) for key in DELTA_RECORDS
+                                if key in snapshot)
+            try:
+                self._handle_snapshot(seq, snapshot)
+            except:
+                self.log('***Exception %s', exc_info()[1])
+        self.app.invalidate()
+
+    def _handle_snapshot(self, seq, snapshot):
+        # All the records for one stop. Apply them together so that panes
+        # are never rendered half-updated.
+        if seq < self.stop_seq:
+            self.log('***Dropped stale snapshot %d', seq)
+            return
+        self.stop_seq = seq
+        times = snapshot.pop('times', None)
+        applied = monotonic()
+        self.log('***Received snapshot %d (%s)', seq, ' '.join(snapshot))
+        for (key, record) in snapshot.items():
+            # Most records are deltas that gdbwhelper will not send again;
+            # a failing pane must not cost the others theirs.
+            try:
+                if not self.router.dispatch(key, record):
+                    self.log('***No handler for %s', key)
+            except:
+                self.log('***Exception handling %s: %s', key, exc_info()[1])
+        if times:
+            self._record_latency(times, applied)
+
+    def _record_latency(self, times, applied):
+        # Stages up to applying a snapshot; painting it is recorded by
+        # _after_render, only for the snapshots of stops: answers to panes'
+        # requests (e.g threads-details) follow them.
+        stop = times.pop('stop', False)
+        record = self.latency.record
+        record('gdb:queue', times['started'] - times['requested'])
+        for (key, seconds) in times.items():
+            if key not in TIMESTAMPS:
+                record('gdb:' + key, seconds)
+        record('pipe', times['received'] - times['sent'])
+        record('parse', times['parsed'] - times['received'])
+        record('queue', applied - times['parsed'])
+        now = monotonic()
+        record('apply', now - applied)
+        if stop:
+            self.painting = (times['requested'], now)
 
+    def _after_render(self, app):
+        if self.painting:
+            (requested, applied) = self.painting
+            self.painting = None
+            now = monotonic()
+            self.latency.record('render', now - applied)
+            self.latency.record('total', now - requested)
+            self.console.set_latency(now - requested)
 
     def _next_style(self):
+        from pygments.styles import get_all_styles
         styles = list(get_all_styles())
         for i in range(0, len(styles)):
             if styles[i] == self.style_name:
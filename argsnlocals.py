@@ -1,7 +1,7 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-from re import search
+from collections import OrderedDict
 
 from prompt_toolkit.filters import Condition
 from prompt_toolkit.layout.containers import ConditionalContainer, HSplit
@@ -9,6 +9,12 @@ from prompt_toolkit.layout import Dimension
 
 from lineitemswindow import LineItemsWindow
 
+# Children shown when a value is expanded, and added for each '...'.
+CHILDREN = 50
+
+# Frames whose values are remembered for highlighting changes.
+FRAMES = 64
+
 class ArgsnLocalsWindow:
     def __init__(self,
                  app=None,
@@ -26,6 +32,14 @@ class ArgsnLocalsWindow:
                                       show=show,
                                       title ='[ Locals ]',
                                       show_divider=self._show_divider)
+        # What each line of a window is: (path, state), where state is None
+        # for values without children, 'collapsed', 'expanded', or, for the
+        # line after the children shown, the number of children to show.
+        self.paths = {'args': [], 'locals': []}
+        # Hash of the summary of each value shown, by (kind, path), for each
+        # frame recently shown; most recent last.
+        self.frames = OrderedDict()
+        self.values = {}
 
         self.container = ConditionalContainer(
             content=HSplit([
@@ -42,17 +56,89 @@ class ArgsnLocalsWindow:
         self.args.toggle_show()
         self.locals.toggle_show()
         
-    def handle_info_args(self, output):
-        self.args.handle_output(output)
-        self.args.fit_to_height()        
-        
-    def handle_info_locals(self, output):
-        self.locals.handle_output(output)
-        self.locals.fit_to_height()
+    def register(self, router):
+        router.register('args', self.handle_args)
+        router.register('locals', self.handle_locals)
+
+    def handle_args(self, records):
+        self._handle_variables('args', records)
+
+    def handle_locals(self, records):
+        self._handle_variables('locals', records)
+
+    def _window(self, kind):
+        return self.args if kind == 'args' else self.locals
+
+    def _handle_variables(self, kind, nodes):
+        lines = []
+        changed = set()
+        self.paths[kind] = []
+        self._add_lines(kind, nodes, [], 0, lines, changed)
+        window = self._window(kind)
+        window.handle_lines(lines, changed)
+        window.fit_to_height()
+
+    def _add_lines(self, kind, nodes, parent, depth, lines, changed):
+        paths = self.paths[kind]
+        values = self.values
+        indent = '  ' * depth
+        for (i, node) in enumerate(nodes):
+            (name, summary, expandable) = node[:3]
+            path = parent + [name if depth == 0 else i]
+            if not expandable:
+                (marker, state) = (' ', None)
+            elif len(node) > 3:
+                (marker, state) = ('-', 'expanded')
+            else:
+                (marker, state) = ('+', 'collapsed')
+            # A value is changed if it differs from when it was last shown
+            # in this frame, wherever its line is now.
+            key = (kind,) + tuple(path)
+            h = hash(summary)
+            if values.get(key, h) != h:
+                changed.add(len(lines))
+            values[key] = h
+            lines.append('%s%s %s = %s' % (indent, marker, name,
+                                           summary.replace('\n', ' ')))
+            paths.append((path, state))
+            if len(node) > 3:
+                kids = node[3]
+                self._add_lines(kind, kids['nodes'], path, depth + 1, lines,
+                                changed)
+                if kids['more']:
+                    lines.append('%s  ...' % indent)
+                    paths.append((path, len(kids['nodes']) + CHILDREN))
+
+    def has_focus(self, kind):
+        return self.app.layout.has_focus(self._window(kind).buffer)
+
+    def toggle_expand(self, kind):
+        # Expands or collapses the value at the cursor, or shows more of
+        # its parent's children.
+        row = self._window(kind).buffer.document.cursor_position_row
+        if row >= len(self.paths[kind]):
+            return
+        (path, state) = self.paths[kind][row]
+        if state is None:
+            return
+        if state == 'collapsed':
+            count = CHILDREN
+        elif state == 'expanded':
+            count = 0
+        else:
+            count = state
+        self.app.console.send('gdbw-expand %s %d %s' %
+                              (kind, count, ' '.join(str(p) for p in path)))
 
-    def handle_frame_change(self):
+    def handle_frame_change(self, frame=None):
+        # Values are remembered per frame, so that going back to a frame
+        # highlights what changed since it was last shown.
         self.args.reset()
         self.locals.reset()
+        self.values = self.frames.pop(frame, {})
+        self.frames[frame] = self.values
+        if len(self.frames) > FRAMES:
+            self.frames.popitem(last=False)
         
     def _show_divider(self):
         return self.app.source.show
@@ -60,3 +146,6 @@ class ArgsnLocalsWindow:
     def reset(self):
         self.args.reset()
         self.locals.reset()
+        self.paths = {'args': [], 'locals': []}
+        self.frames = OrderedDict()
+        self.values = {}
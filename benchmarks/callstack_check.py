@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+# Checks that the frames gdbw builds from records.Callstack deltas match the
+# real stack, through steps, calls, returns and scrolling, and counts how
+# often gdbw has to ask for the whole stack again. Runs without gdb, against
+# a stand-in gdb module.
+#
+#   $ python3 benchmarks/callstack_check.py [stops]
+
+from os.path import abspath, dirname
+from random import Random
+from sys import argv, exit, modules, path
+from types import ModuleType
+
+class Frame:
+    # stack holds (pc, sp) of each frame, newest first.
+    def __init__(self, stack, i):
+        self.stack = stack
+        self.i = i
+
+    def pc(self):
+        return self.stack[self.i][0]
+
+    def name(self):
+        return 'f%x' % self.pc()
+
+    def level(self):
+        return self.i
+
+    def older(self):
+        return Frame(self.stack, self.i + 1) \
+            if self.i + 1 < len(self.stack) else None
+
+    def read_register(self, name):
+        return self.stack[self.i][1]
+
+    def find_sal(self):
+        sal = ModuleType('sal')
+        sal.symtab = None
+        return sal
+
+gdb = ModuleType('gdb')
+gdb.error = RuntimeError
+gdb.stack = []
+def newest_frame():
+    if not gdb.stack:
+        raise gdb.error('No stack.')
+    return Frame(gdb.stack, 0)
+gdb.newest_frame = newest_frame
+modules['gdb'] = gdb
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+from records import Callstack
+
+class Pane:
+    '''The frames CallstackWindow keeps, updated the same way.'''
+    def __init__(self, callstack):
+        self.callstack = callstack
+        self.frames = []
+        self.resets = 0
+
+    def handle_callstack(self, record):
+        keep = record['keep']
+        if keep > len(self.frames):
+            # CallstackWindow asks for gdbw-callstack-reset.
+            self.resets += 1
+            self.callstack.reset()
+            self.frames = []
+            record = self.callstack.record(None)
+        self.frames = record['frames'] + \
+            self.frames[len(self.frames) - record['keep']:]
+
+    def handle_callstack_more(self, record):
+        if record['level'] == len(self.frames):
+            self.frames = self.frames + record['frames']
+
+    def check(self, stack):
+        pcs = [f['pc'] for f in self.frames]
+        return pcs == [pc for (pc, sp) in stack[:len(pcs)]]
+
+def stop(pane):
+    pane.handle_callstack(pane.callstack.record(None))
+    return pane.check(gdb.stack)
+
+def call(rng):
+    (pc, sp) = gdb.stack[0]
+    gdb.stack.insert(0, (0x1000 + rng.randrange(0, 1 << 16), sp - 64))
+
+def step_then_call():
+    gdb.stack[:] = [(0x100 + i, 0x8000 - 64 * i) for i in range(40)][::-1]
+    pane = Pane(Callstack(lines=8))
+    ok = stop(pane)
+    for i in range(0, 3):
+        (pc, sp) = gdb.stack[0]
+        gdb.stack[0] = (pc + 4, sp)
+        ok = stop(pane) and ok
+        call(Random(i))
+        ok = stop(pane) and ok
+    return ok and pane.resets == 0
+
+def other_caller():
+    # A breakpoint in foo, hit from a and then from b at the same depth:
+    # only the caller's pc tells the two newest frames apart.
+    pane = Pane(Callstack(lines=8))
+    gdb.stack[:] = [(0x5000, 0x7f00), (0x4010, 0x7f40), (0x100, 0x8000)]
+    ok = stop(pane)
+    gdb.stack[:] = [(0x5000, 0x7f00), (0x4110, 0x7f40), (0x100, 0x8000)]
+    return stop(pane) and ok and pane.resets == 0
+
+def random_session(stops):
+    rng = Random(1)
+    gdb.stack[:] = [(0x100 + i, 0x8000 - 64 * i) for i in range(50)][::-1]
+    pane = Pane(Callstack(lines=16))
+    mismatches = 0
+    for i in range(0, stops):
+        op = rng.random()
+        if op < 0.4:
+            (pc, sp) = gdb.stack[0]
+            gdb.stack[0] = (pc + 4, sp)
+        elif op < 0.65:
+            call(rng)
+        elif op < 0.9 and len(gdb.stack) > 1:
+            gdb.stack.pop(0)
+        else:
+            pane.handle_callstack_more(
+                pane.callstack.more(len(pane.frames), 16))
+        if not stop(pane):
+            mismatches += 1
+    return (mismatches, pane.resets)
+
+if __name__ == '__main__':
+    stops = int(argv[1]) if len(argv) > 1 else 60000
+    ok = step_then_call()
+    print('step then call: %s' % ('ok' if ok else 'FAILED'))
+    caller = other_caller()
+    print('other caller: %s' % ('ok' if caller else 'FAILED'))
+    ok = ok and caller
+    (mismatches, resets) = random_session(stops)
+    print('%d stops: %d mismatches, %d resets' % (stops, mismatches, resets))
+    exit(0 if ok and not mismatches and not resets else 1)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+# Synthetic sessions for replay.py: the messages gdbwhelper would send while
+# stepping through programs that are hard on one pane each.
+#
+#   $ python3 benchmarks/fixtures.py DIR [NAME...]
+#
+# writes each session to DIR/NAME.frames, in the framing NamedPipe uses, along
+# with the sources they refer to.
+
+from collections import OrderedDict
+from json import dumps
+from os import makedirs
+from os.path import abspath, dirname, join
+from random import Random
+from sys import argv, exit, path
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+from namedpipe import HEADER
+
+# Stops in each session.
+STOPS = 50
+
+PID = 4242
+
+def snapshot(seq, records):
+    return ('snapshot %d\n%s' %
+            (seq, dumps(records, separators=(',', ':')))).encode('utf-8')
+
+def frame(func, pc, level=0, path=None, line=None):
+    rec = {'func': func, 'pc': pc, 'level': level, 'addr': 0x7ffe0000 - level}
+    if path:
+        rec['file'] = path.rsplit('/', 1)[-1]
+        rec['path'] = path
+        rec['line'] = line
+    return rec
+
+def first(records):
+    # The records of the first stop of a process.
+    records['inferior'] = {'num': 1, 'pid': PID}
+    return records
+
+def breakpoint(num, hits=0):
+    return {'num': num,
+            'type': 'breakpoint',
+            'enabled': num % 7 != 0,
+            'what': 'module%d.c:%d' % (num // 100, num % 100 + 10),
+            'hits': hits,
+            'locs': [{'addr': 0x400000 + num * 16,
+                      'func': 'handler_%d' % num,
+                      'file': 'module%d.c' % (num // 100),
+                      'path': '/src/module%d.c' % (num // 100),
+                      'line': num % 100 + 10}]}
+
+def breakpoints(directory, count=5000):
+    # Thousands of breakpoints; one is hit at each stop.
+    rng = Random(1)
+    hits = [0] * count
+    msgs = [snapshot(1, first({
+        'frame': frame('main', 0x400000),
+        'breakpoints': {'full': [breakpoint(n) for n in range(1, count + 1)]}
+    }))]
+    for seq in range(2, STOPS + 1):
+        n = rng.randrange(1, count + 1)
+        hits[n - 1] += 1
+        msgs.append(snapshot(seq, {
+            'frame': frame('handler_%d' % n, 0x400000 + n * 16),
+            'inferior': {'num': 1, 'pid': PID},
+            'breakpoints': {'changed': [breakpoint(n, hits[n - 1])],
+                            'deleted': []}
+        }))
+    return msgs
+
+def thread_details(nums, selected):
+    return [{'num': n, 'name': 'worker-%d' % n, 'func': 'wait_for_work',
+             'pc': 0x401000 + n} for n in sorted(set(nums) | set([selected]))]
+
+def threads(directory, count=4000):
+    # Thousands of threads, a few of which come and go between stops.
+    rng = Random(2)
+    nums = list(range(1, count + 1))
+    shown = nums[:20]
+    msgs = [snapshot(1, first({
+        'threads': {'full': [[n, 'LWP %d' % (PID + n)] for n in nums],
+                    'selected': 1,
+                    'details': thread_details(shown, 1)},
+        'frame': frame('main', 0x400000)
+    }))]
+    last = count
+    for seq in range(2, STOPS + 1):
+        removed = sorted(rng.sample(nums[1:], 3))
+        for n in removed:
+            nums.remove(n)
+        added = [last + 1, last + 2, last + 3]
+        last += 3
+        nums.extend(added)
+        selected = rng.choice(nums)
+        msgs.append(snapshot(seq, {
+            'threads': {'added': [[n, 'LWP %d' % (PID + n)] for n in added],
+                        'removed': removed,
+                        'selected': selected,
+                        'details': thread_details(shown, selected)},
+            'frame': frame('wait_for_work', 0x401000 + selected)
+        }))
+    return msgs
+
+def source(directory, lines=100000):
+    # Stepping through a 100k line source file, with the odd jump to a
+    # distant function.
+    path = join(directory, 'big.c')
+    with open(path, 'w') as f:
+        for i in range(0, lines, 10):
+            f.write('/* function %d */\n'
+                    'int f%d(int a, int b)\n'
+                    '{\n'
+                    '    int x = a * %d;\n'
+                    '    if (x > b)\n'
+                    '        x -= b;\n'
+                    '    // keep going\n'
+                    '    x += f%d(b, a);\n'
+                    '    return x;\n'
+                    '}\n' % (i, i, i, i + 10))
+    rng = Random(3)
+    line = 4
+    msgs = []
+    for seq in range(1, STOPS + 1):
+        if seq % 20 == 0:
+            line = rng.randrange(0, lines // 10) * 10 + 4
+        else:
+            line = min(lines, line + 1)
+        rec = {'frame': frame('f%d' % (line // 10 * 10), 0x400000 + line,
+                              path=path, line=line)}
+        msgs.append(snapshot(seq, first(rec) if seq == 1 else rec))
+    return msgs
+
+def stack_frame(level, depth):
+    return frame('recurse', 0x402000 + (depth - level) % 64, level,
+                 '/src/recurse.c', 100 + (depth - level) % 64)
+
+def callstack(directory, depth=10000, page=32):
+    # A deep recursion, paged all the way down once, then stepped through
+    # the innermost calls.
+    msgs = [snapshot(1, first({
+        'frame': frame('recurse', 0x402000),
+        'callstack': {'frames': [stack_frame(l, depth) for l in range(page)],
+                      'keep': 0, 'more': True}
+    }))]
+    for level in range(page, depth, 1024):
+        count = min(1024, depth - level)
+        msgs.append(snapshot(1, {
+            'callstack-more': {
+                'level': level,
+                'frames': [stack_frame(l, depth)
+                           for l in range(level, level + count)],
+                'more': level + count < depth}
+        }))
+    for seq in range(2, STOPS + 1):
+        # Alternately return from and make a call.
+        depth += 1 if seq % 2 else -1
+        top = stack_frame(0, depth)
+        msgs.append(snapshot(seq, {
+            'frame': frame('recurse', top['pc']),
+            'callstack': {'frames': [top] if seq % 2 else [],
+                          'keep': depth - 1 if seq % 2 else depth,
+                          'more': False}
+        }))
+    return msgs
+
+def node(name, index, depth, expanded):
+    summary = '{id = %d, name = "item-%d", values = {%s...}}' % (
+        index, index, ', '.join(str(index + i) for i in range(16)))
+    rec = [name, summary, depth < 3]
+    if expanded and depth < 3:
+        rec.append({'nodes': [node('[%d]' % i, index * 50 + i, depth + 1,
+                                   i < 2) for i in range(50)],
+                    'more': True})
+    return rec
+
+def variables(directory, count=500):
+    # Hundreds of locals with long summaries; a few are expanded two
+    # levels deep. Some values change at each stop.
+    msgs = []
+    for seq in range(1, STOPS + 1):
+        base = seq // 10
+        locals_ = [node('local_%d' % i, i + (base if i % 10 == 0 else 0), 0,
+                        i < 3)
+                   for i in range(count)]
+        rec = {'frame': frame('process_items', 0x403000 + seq % 8),
+               'args': [node('items', seq, 0, True),
+                        ['count', str(count), False]],
+               'locals': locals_}
+        msgs.append(snapshot(seq, first(rec) if seq == 1 else rec))
+    return msgs
+
+FIXTURES = OrderedDict([
+    ('breakpoints', breakpoints),
+    ('threads', threads),
+    ('source', source),
+    ('callstack', callstack),
+    ('variables', variables),
+])
+
+def write(path, msgs):
+    with open(path, 'wb') as f:
+        for msg in msgs:
+            f.write(HEADER.pack(len(msg)))
+            f.write(msg)
+
+if __name__ == '__main__':
+    if len(argv) < 2:
+        print('Usage: %s DIR [%s...]' % (argv[0], '|'.join(FIXTURES)))
+        exit(1)
+    directory = abspath(argv[1])
+    makedirs(directory, exist_ok=True)
+    for name in argv[2:] or FIXTURES:
+        msgs = FIXTURES[name](directory)
+        write(join(directory, name + '.frames'), msgs)
+        print('%s: %d messages, %d KB' %
+              (name, len(msgs), sum(len(m) for m in msgs) >> 10))
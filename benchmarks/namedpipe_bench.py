@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+# Measures NamedPipe throughput for 1 KB, 1 MB and 16 MB messages, against
+# the NUL-delimited reader that NamedPipe used before length-prefixed frames.
+#
+#   $ python3 benchmarks/namedpipe_bench.py [total MB per size]
+
+from os import close, getpid, open, read, O_RDONLY
+from os.path import abspath, dirname
+from sys import argv, path
+from threading import Event, Thread
+from time import perf_counter
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+from namedpipe import NamedPipe
+
+SIZES = [('1 KB', 1024), ('1 MB', 1024 * 1024), ('16 MB', 16 * 1024 * 1024)]
+
+def nul_reader(pipe, count, done):
+    # The reader loop NamedPipe used with NUL-delimited frames.
+    fd = open(pipe.path, O_RDONLY)
+    buffer = b''
+    received = 0
+    while received < count:
+        p = buffer.find(b'\0')
+        if p >= 0:
+            chunk = buffer[0:p].decode('utf-8')
+            buffer = buffer[p+1:]
+            if chunk != '':
+                received += 1
+            continue
+        buffer += read(fd, 4096)
+    close(fd)
+    done.set()
+
+def run(name, size, count, framed):
+    pipe_path = '/tmp/gdbw_bench_%d_%s' % (getpid(), 'framed' if framed else 'nul')
+    reader = NamedPipe(pipe_path)
+    writer = NamedPipe(pipe_path, framed=framed)
+    done = Event()
+    received = [0]
+
+    if framed:
+        def callback(frame):
+            str(frame, 'utf-8')
+            received[0] += 1
+            if received[0] == count:
+                done.set()
+        reader.begin_reading(callback)
+    else:
+        Thread(target=nul_reader, args=(reader, count, done), daemon=True).start()
+
+    payload = ('x' * size).encode('utf-8')
+    start = perf_counter()
+    for i in range(0, count):
+        writer.write(payload)
+        if not framed:
+            writer.write(b'\0')
+    done.wait()
+    elapsed = perf_counter() - start
+    writer.close()
+    reader.stop_reading()
+    return (size * count) / elapsed / (1024 * 1024), count / elapsed
+
+def main():
+    total = int(argv[1]) if len(argv) > 1 else 64
+    print('{:<8} {:<14} {:>10} {:>12}'.format('size', 'framing', 'MB/s', 'msgs/s'))
+    for (name, size) in SIZES:
+        count = max(1, total * 1024 * 1024 // size)
+        for framed in [True, False]:
+            framing = 'length' if framed else 'nul'
+            if not framed and size > 1024 * 1024:
+                # Quadratic; takes minutes.
+                print('{:<8} {:<14} {:>10} {:>12}'.format(name, framing,
+                                                          'skipped', ''))
+                continue
+            (mbps, mps) = run(name, size, count, framed)
+            print('{:<8} {:<14} {:>10.1f} {:>12.1f}'.format(name, framing,
+                                                            mbps, mps))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+# Replays messages from gdbwhelper through gdbw's panes without gdb or a
+# terminal, and reports the time spent parsing, in each pane's handler and
+# rendering, and the memory allocated doing so.
+#
+#   $ python3 benchmarks/replay.py [NAME|FILE...]
+#
+# NAME is one of the synthetic sessions in fixtures.py (all of them by
+# default). FILE is a recording of a real session, made by running gdbw with
+# GDBW_RECORD=FILE.
+
+from asyncio import get_running_loop, run, sleep
+from collections import Counter
+from io import FileIO
+from os.path import abspath, dirname, exists
+from sys import argv, path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+
+from prompt_toolkit.application.current import create_app_session, set_app
+from prompt_toolkit.data_structures import Size
+from prompt_toolkit.input import create_pipe_input
+from prompt_toolkit.layout.containers import Window
+from prompt_toolkit.layout.controls import FormattedTextControl
+from prompt_toolkit.output import DummyOutput
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+path.insert(0, dirname(abspath(__file__)))
+from application import Application
+from fixtures import FIXTURES
+from latency import Latency
+from namedpipe import FrameReader
+
+# Allocation sites listed for each session.
+TOP_ALLOCATIONS = 8
+
+class ScreenOutput(DummyOutput):
+    '''Discards output, but has the size of a large terminal.'''
+    def get_size(self):
+        return Size(rows=60, columns=200)
+
+class HeadlessConsole:
+    '''Stands in for the gdb console. Requests from panes are counted.'''
+    def __init__(self, app, callback=None):
+        self.app = app
+        self.gdbw_log_pipe = None
+        self.requests = Counter()
+        self.window = Window(FormattedTextControl('(gdb) '))
+
+    def get_ui(self):
+        return self.window
+
+    def send(self, msg):
+        self.requests[msg.split()[0]] += 1
+
+    def log(self, msg, *args):
+        pass
+
+    def enter_copy_mode(self):
+        pass
+
+    def toggle_hud(self):
+        pass
+
+    def set_latency(self, seconds):
+        pass
+
+    def update_info(self):
+        pass
+
+def load(path):
+    msgs = []
+    frames = FrameReader()
+    with FileIO(path, 'r') as f:
+        while frames.read(f, lambda frame: msgs.append(bytes(frame))):
+            pass
+    return msgs
+
+async def replay(msgs, latency):
+    with create_pipe_input() as input, \
+         create_app_session(input=input, output=ScreenOutput()):
+        app = Application(console=HeadlessConsole)
+        for pane in app._panes().values():
+            if not pane.show:
+                pane.toggle_show()
+        app.messages.attach(get_running_loop())
+        with set_app(app.app):
+            render = lambda: app.app.renderer.render(app.app, app.layout)
+            render()
+            for msg in msgs:
+                start = perf_counter()
+                app._gdb_callback(msg)
+                parsed = perf_counter()
+                # Let the event loop apply the message.
+                await sleep(0)
+                applied = perf_counter()
+                render()
+                rendered = perf_counter()
+                latency.record('parse', parsed - start)
+                latency.record('apply', applied - parsed)
+                latency.record('render', rendered - applied)
+        app.messages.detach()
+    # Only the pane handlers' times; those of gdb and the pipe were
+    # recorded with the message, not here.
+    for (stage, h) in app.latency.histograms.items():
+        if stage.startswith('pane:'):
+            latency.histograms[stage] = h
+    return app
+
+def report(name, msgs):
+    size = sum(len(m) for m in msgs)
+    print('== %s: %d messages, %d KB' % (name, len(msgs), size >> 10))
+    latency = Latency()
+    app = run(replay(msgs, latency))
+    print(latency.report())
+    requests = app.console.requests
+    if requests:
+        print('requests: %s\n' % ' '.join('%s=%d' % r for r in
+                                          sorted(requests.items())))
+
+    # Again, tracing allocations; tracemalloc slows everything down.
+    tracemalloc.start()
+    app = run(replay(msgs, Latency()))
+    snapshot = tracemalloc.take_snapshot()
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('memory: %d KB in use, %d KB peak' % (current >> 10, peak >> 10))
+    stats = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__)])
+    for stat in stats.statistics('lineno')[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        print('%8d KB %6d blocks  %s:%d' % (stat.size >> 10, stat.count,
+                                             frame.filename, frame.lineno))
+    print('')
+
+if __name__ == '__main__':
+    with TemporaryDirectory() as directory:
+        for name in argv[1:] or FIXTURES:
+            if name in FIXTURES:
+                report(name, FIXTURES[name](directory))
+            elif exists(name):
+                report(name, load(name))
+            else:
+                print('%s: no such fixture or recording' % name)
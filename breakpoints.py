@@ -1,26 +1,24 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-
-from re import compile, search
+from bisect import insort
+from os.path import normpath
 
 from prompt_toolkit.layout import Dimension, ScrollOffsets
-from prompt_toolkit.lexers import PygmentsLexer
 from prompt_toolkit.lexers.base import Lexer
 
-from pygments.lexers import get_lexer_by_name, CLexer
-from pygments.token import Token
-
+from highlighter import shared_lexer
 from window import Window
 
+NO_LINES = frozenset()
+
 
 class BreakpointsLexer(Lexer):
     def __init__(self):
         super(BreakpointsLexer, self).__init__()
-        self.lexer = PygmentsLexer(CLexer, sync_from_start=False)
 
     def lex_document(self, document):
-        lexer_lex_line = self.lexer.lex_document(document)
+        lexer_lex_line = shared_lexer('c').lex_document(document)
         def lex_line(lineno):
             line = document.lines[lineno]
             if line.strip().startswith('at'):
@@ -42,10 +40,9 @@ class BreakpointsWindow(Window):
                  show=False,
                  height=Dimension(preferred=5)):
         self.lexer = BreakpointsLexer()
-        self.breakpoints = {}
-        self.changed = {}
-        self.database = {}
-        self.hits = {}
+        self._clear()
+        # Bumped whenever file_lines changes, to tell users to refetch.
+        self.generation = 0
         scroll_offsets = ScrollOffsets(top=2,
                                        bottom=2)
         super(BreakpointsWindow, self).__init__(app=app,
@@ -53,94 +50,153 @@ class BreakpointsWindow(Window):
                                                 title='[ Breakpoints ]',
                                                 scroll_offsets=scroll_offsets)
 
+    def _clear(self):
+        # Breakpoint records by number, in number order.
+        self.records = {}
+        self.order = []
+        # Rendered lines per breakpoint.
+        self.rows = {}
+        # Breakpoints whose hit count changed at the last update.
+        self.changed = set()
+        # Number of breakpoint locations per address.
+        self.database = {}
+        # Number of breakpoint locations per line, per normalized path.
+        self.file_lines = {}
+
+    def register(self, router):
+        router.register('breakpoints', self.handle_breakpoints)
+
     def has_breakpoint(self, loc):
         return loc in self.database
 
-    def _build_database(self, output):
-        database = {}
-        hits = {}
-        changed = {}
-        lines = output.strip().split('\n')
-        hc = ''
-        breakpoints = {}
-        if len(lines) > 1:
-            ptype = lines[0].find('Type')
-            pdisp = lines[0].find('Disp', ptype)
-            penb = lines[0].find('Enb', pdisp)
-            paddress = lines[0].find('Address', penb)
-            pwhat = lines[0].find('What', paddress)
-            rebnum = compile('(\d+\.\d+)|(\d+)')
-            reddr = compile('(0x.+)')
-            rhc = compile('hit (\d+) time')
-            bnum = ''
-            for line in lines[1:]:
-                m = rebnum.search(line)
-                if m and m.start() == 0:
-                    # breakpoint line
-                    bnum = m[1] if m[1] else m[2]
-                    typ = line[ptype:pdisp].strip()
-                    disp = line[pdisp:penb].strip()
-                    enb = line[penb:paddress].strip() == 'y'
-                    address = line[paddress:pwhat].strip()
-                    if address[0:1] == '0':
-                        database[address] = True
-                    what = line[pwhat:].strip()
-                    hits[bnum] = ''
-                    at = ''
-                    pat = what.find('at ')
-                    if pat > 0:
-                        at = what[pat+3:]
-                        database[at] = True
-                        what = what[:pat].strip()
-                    else:
-                        if not what.startswith('in'):
-                            at = what
-                            what = ''
-                    breakpoints[bnum] = (typ, disp, enb, address, what, at)
+    def lines_for(self, path):
+        return self.file_lines.get(normpath(path), NO_LINES)
+
+    def _index(self, rec, delta):
+        # Adds (delta=1) or removes (delta=-1) rec's locations from the
+        # address and line indexes. Returns True if the line index changed.
+        lines_changed = False
+        for loc in rec['locs']:
+            address = '0x%016x' % loc['addr']
+            count = self.database.get(address, 0) + delta
+            if count:
+                self.database[address] = count
+            else:
+                del self.database[address]
+            if 'line' in loc:
+                path = normpath(loc['path'])
+                lines = self.file_lines.setdefault(path, {})
+                count = lines.get(loc['line'], 0) + delta
+                if count == (1 if delta > 0 else 0):
+                    lines_changed = True
+                if count:
+                    lines[loc['line']] = count
                 else:
-                    m = rhc.search(line)
-                    if m:
-                        hc = m[1]
-                        hits[bnum] = hc
-                        if hc != '':
-                            if bnum not in self.hits or self.hits[bnum] != hc:
-                                changed[bnum] = True
-                        
-
-        self.changed = changed
-        self.breakpoints = breakpoints
-        self.database = database
-        self.hits = hits
-
-                
-    def handle_info_breakpoints(self, output):
-        self._build_database(output)
-        if len(self.breakpoints) == 0:
-            self.buffer.text = output
-            self.fit_to_height()
+                    del lines[loc['line']]
+                    if not lines:
+                        del self.file_lines[path]
+        return lines_changed
+
+    def _render(self, rec):
+        bnum = str(rec['num'])
+        locs = rec['locs']
+        rows = []
+        def add_row(num, address, what, at):
+            ch = '*' if num == bnum and rec['num'] in self.changed else ' '
+            line = ' {}{:<4} {:<10} {:<18} {}'.format(ch, num, rec['type'],
+                                                      address, what)
+            if num == bnum and rec['hits']:
+                line += ' hit %d time' % rec['hits']
+                if rec['hits'] != 1:
+                    line += 's'
+            rows.append(line)
+            if at != '':
+                rows.append('       at ' + at)
+
+        if len(locs) != 1:
+            add_row(bnum, '<MULTIPLE>' if locs else '', rec['what'], '')
+        for i in range(0, len(locs)):
+            loc = locs[i]
+            num = bnum if len(locs) == 1 else '%s.%d' % (bnum, i + 1)
+            what = 'in ' + loc['func'] if loc['func'] else ''
+            at = '%s:%d' % (loc['file'], loc['line']) if 'line' in loc else ''
+            add_row(num, '0x%016x' % loc['addr'], what, at)
+        return rows
+
+    def _update(self, rec):
+        # Returns True if the line index changed.
+        num = rec['num']
+        old = self.records.get(num)
+        if old == rec:
+            return False
+        lines_changed = False
+        if old:
+            lines_changed = self._index(old, -1)
+        else:
+            insort(self.order, num)
+        if rec['hits'] and (not old or rec['hits'] != old['hits']):
+            self.changed.add(num)
+        self.records[num] = rec
+        self.rows.pop(num, None)
+        return self._index(rec, 1) or lines_changed
+
+    def _delete(self, num):
+        old = self.records.pop(num, None)
+        if not old:
+            return False
+        self.order.remove(num)
+        self.rows.pop(num, None)
+        self.changed.discard(num)
+        return self._index(old, -1)
+
+    def handle_breakpoints(self, delta):
+        '''
+        Applies a breakpoint delta from gdbwhelper: either the full list of
+        breakpoint records, or the records that changed and the numbers of
+        those deleted since the last delta.
+        '''
+        if 'full' in delta:
+            changed = delta['full']
+            nums = set(rec['num'] for rec in changed)
+            deleted = [num for num in self.order if num not in nums]
+        else:
+            changed = delta['changed']
+            deleted = delta['deleted']
+        if not self.order and not changed:
+            # e.g the first stop, or one after a rerun, with no breakpoints.
+            self._show_empty()
+            return
+        if not changed and not deleted and not self.changed:
+            return
+
+        # Hit markers only last until the next update.
+        for num in self.changed:
+            self.rows.pop(num, None)
+        self.changed = set()
+
+        lines_changed = False
+        for num in deleted:
+            lines_changed = self._delete(num) or lines_changed
+        for rec in changed:
+            lines_changed = self._update(rec) or lines_changed
+        if lines_changed:
+            self.generation += 1
+
+        if len(self.order) == 0:
+            self._show_empty()
             return
 
-        lines = []
-        for (bnum, val) in self.breakpoints.items():
-            ch = ' '
-            if bnum in self.changed and self.changed[bnum]:
-                ch = '*'
-            line = ' {}{:<4} {:<10} {:<18} {}'.format(ch, bnum, val[0], val[3], val[4])
-            if bnum in self.hits:
-                hc = self.hits[bnum]
-                if hc != '':
-                    line += ' hit %s time' % hc
-                    if hc != '1':
-                        line += 's'
-            lines.append(line)
-            if val[5] != '':
-                lines.append('       at ' + val[5])
-
-        self.buffer.text = '\n'.join(lines)        
+        for num in self.order:
+            if num not in self.rows:
+                self.rows[num] = self._render(self.records[num])
+        self.buffer.text = '\n'.join(line for num in self.order
+                                      for line in self.rows[num])
+
+    def _show_empty(self):
+        self.buffer.text = 'No breakpoints or watchpoints.'
+        self.fit_to_height()
 
     def reset(self):
         self.buffer.text = ''
-        self.database = {}
-        self.hits = {}
-        self.breakpoints = {}
-        self.changed = {}
+        self._clear()
+        self.generation += 1
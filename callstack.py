@@ -1,24 +1,18 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-from re import compile, search
-
 from prompt_toolkit.layout import Dimension, ScrollOffsets
-from prompt_toolkit.lexers import PygmentsLexer
 from prompt_toolkit.lexers.base import Lexer
 
-from pygments.lexers import get_lexer_by_name, CLexer
-from pygments.token import Token
-
+from highlighter import shared_lexer
 from window import Window
 
 class CallstackLexer(Lexer):
     def __init__(self):
         super(CallstackLexer, self).__init__()
-        self.lexer = PygmentsLexer(CLexer, sync_from_start=False)
 
     def lex_document(self, document):
-        lexer_lex_line = self.lexer.lex_document(document)
+        lexer_lex_line = shared_lexer('c').lex_document(document)
         def lex_line(lineno):
             if lineno % 2 == 0:
                 parts = lexer_lex_line(lineno)
@@ -35,6 +29,12 @@ class CallstackWindow(Window):
                  show=False,
                  height=Dimension(preferred=20)):
         self.frame = None
+        self.frames = []
+        # Whether there are frames older than those in self.frames.
+        self.more = False
+        self.requested = False
+        self.updating = False
+        self.lines_sent = None
         self.lexer = CallstackLexer()
         scroll_offsets = ScrollOffsets(top=5,
                                        bottom=5)
@@ -42,26 +42,81 @@ class CallstackWindow(Window):
                                               show=show,
                                               title='[ Callstack ]',
                                               scroll_offsets=scroll_offsets)
+        self.buffer.on_cursor_position_changed += self._cursor_moved
+
+    def register(self, router):
+        router.register('callstack', self.handle_callstack)
+        router.register('callstack-more', self.handle_callstack_more)
 
-    def handle_bt(self, output):
-        output = output.replace(' at ', '\n       ')
-        p = compile('\s*(\(.*\))')
-        #output = p.sub(lambda m: '\n   ' + m[1], output)
-        output = p.sub(lambda m: '', output)
-        p = compile('#(\d+)')
-        output = p.sub(lambda m: '  [%s]' % m[1], output)
-        if self.frame:
-            p = compile('(  \[%s\])' % self.frame)
-            output = p.sub('=>[%s]' % self.frame, output)
-            p = output.find('=>')
-            self.buffer.cursor_position = p
-        self.buffer.text = output.rstrip()
+    def _render(self, cursor_line):
+        lines = []
+        for (level, rec) in enumerate(self.frames):
+            if level == self.frame:
+                cursor_line = len(lines)
+                lines.append('=>[%d]  %s' % (level, rec['func']))
+            else:
+                lines.append('  [%d]  %s' % (level, rec['func']))
+            if 'line' in rec:
+                lines.append('       %s:%d' % (rec['file'], rec['line']))
+            else:
+                lines.append('       0x%016x' % rec['pc'])
+        self.updating = True
+        self.buffer.text = '\n'.join(lines)
+        self.buffer.cursor_position = \
+            self.buffer.document.translate_row_col_to_index(cursor_line, 0)
+        self.updating = False
         self.fit_to_height()
 
-    def handle_info_frame(self, output):
-        m = search('Stack level (\d+)', output)
-        self.frame = None
-        if m:            
-            self.frame = m[1]
+    def _page(self):
+        render_info = self.window.render_info
+        return max(render_info.window_height if render_info else 20, 16)
+
+    def handle_callstack(self, record):
+        # The record has the frames that changed, newest first, and the
+        # number of older frames to keep.
+        keep = record['keep']
+        if keep > len(self.frames):
+            self.app.log('*** Callstack out of sync')
+            self.frames = []
+            self.buffer.text = ''
+            self.app.console.send('gdbw-callstack-reset')
+            return
+        self.frames = record['frames'] + self.frames[len(self.frames) - keep:]
+        self.more = record['more']
+        self.requested = False
+        self._render(0)
+        if self.frame is not None and self.frame >= len(self.frames):
+            # The selected frame is past the frames fetched so far.
+            self._request(self.frame + self._page() // 2 - len(self.frames))
+
+        # Fetch a couple of panes worth of frames at each stop.
+        lines = self._page()
+        if lines != self.lines_sent:
+            self.lines_sent = lines
+            self.app.console.send('gdbw-callstack-lines %d' % lines)
+
+    def handle_callstack_more(self, record):
+        if record['level'] != len(self.frames):
+            return
+        self.frames = self.frames + record['frames']
+        self.more = record['more']
+        self.requested = False
+        self._render(self.buffer.document.cursor_position_row)
+
+    def _cursor_moved(self, buffer):
+        # Fetch the next page when the cursor gets close to the last frame.
+        if self.updating or self.requested or not self.more:
+            return
+        row = buffer.document.cursor_position_row
+        page = self._page()
+        if row // 2 >= len(self.frames) - page // 2:
+            self._request(page)
+
+    def _request(self, count):
+        if self.more and not self.requested:
+            self.requested = True
+            self.app.console.send('gdbw-callstack %d %d' %
+                                  (len(self.frames), count))
 
-    
+    def handle_frame(self, record):
+        self.frame = record['level'] if record else None
@@ -3,8 +3,7 @@
 # Licensed under the MIT License
 
 from os import environ, getpid
-from os.path import abspath, dirname
-from subprocess import check_output
+from os.path import abspath, dirname, realpath
 from sys import argv, exit
 
 from prompt_toolkit.application import get_app
@@ -13,8 +12,9 @@ from prompt_toolkit.layout.containers import ConditionalContainer, Window, HSpli
 from prompt_toolkit.widgets import Box,Frame,Shadow
 from ptterm import Terminal
 
+from gdbpath import find_gdb
 from infoline import InfoLine
-from namedpipe import NamedPipe
+from namedpipe import FrameRecorder, NamedPipe
 
 class ConsoleWindow:
     def __init__(self,
@@ -36,10 +36,19 @@ class ConsoleWindow:
                                 height=height,
                                 width=width)
         self.info = InfoLine(text='', width=240)
+        # Stop-to-paint latency shown in the info line (Ctrl-x l).
+        self.hud = False
+        self.latency = None
         self.window = HSplit([self.info.get_ui(),
                               self.console])
         self.update_info()
-        self.in_pipe.begin_reading(callback)
+        # Messages from gdbwhelper are saved to GDBW_RECORD, if set, for
+        # replaying with benchmarks/replay.py.
+        self.recorder = None
+        if environ.get('GDBW_RECORD'):
+            callback = self.recorder = FrameRecorder(environ['GDBW_RECORD'],
+                                                     callback)
+        self.in_pipe.begin_reading(callback, error_callback=self.log)
 
     def get_ui(self):
         return self.window
@@ -50,31 +59,38 @@ class ConsoleWindow:
     def exit_copy_mode(self):
         self.console.exit_copy_mode()
         
-    def log(self, msg):
+    def send(self, msg):
+        self.out_pipe.write(msg)
+
+    def log(self, msg, *args):
+        # msg is formatted with args only if logging is on.
         if self.gdbw_log_pipe:
+            if args:
+                msg = msg % args
             self.gdbw_log_pipe.write(str(msg) + '\n')
     
     def _get_gdbw_dir(self):
         return dirname(abspath(__file__))
 
     def _get_gdb_path(self):
-        gdbscript_path = self._get_gdbw_dir() + '/gdb'
-        gdb_paths = check_output(['which', '-a', 'gdb'])
-        gdb_paths = gdb_paths.decode('utf-8').strip().split('\n')
-        for g in gdb_paths:
-            g = check_output(['readlink', '-f', g]).decode('utf-8').strip()
-            if g != gdbscript_path:
-                return g
+        gdb = find_gdb(realpath(self._get_gdbw_dir() + '/gdb'))
+        if gdb:
+            return gdb
         print('Could not find gdb. Aborting.')
         exit(1)
 
     def _done(self):
+        self.app.log_stats()
+        self.in_pipe.stop_reading()
         self.in_pipe.close()
         self.out_pipe.close()
+        if self.recorder:
+            self.recorder.close()
         if self.log_pipe:
             self.log_pipe.close()
         if self.gdbw_log_pipe:
             self.gdbw_log_pipe.close()
+            self.gdbw_log_pipe = None
         get_app().exit()
 
 
@@ -89,8 +105,10 @@ class ConsoleWindow:
         self.log_pipe = None
         try:
             if int(environ['GDBW_ENABLE_LOGGING']):
-                self.gdbw_log_pipe = NamedPipe('/tmp/gdbw_log_%d' % (pid))
-                self.log_pipe = NamedPipe('/tmp/gdbh_log_%d' % (pid))
+                self.gdbw_log_pipe = NamedPipe('/tmp/gdbw_log_%d' % (pid),
+                                               framed=False)
+                self.log_pipe = NamedPipe('/tmp/gdbh_log_%d' % (pid),
+                                          framed=False)
                 pipes_str += '\n' + self.log_pipe.path
         except:
             pass
@@ -103,8 +121,20 @@ class ConsoleWindow:
         gdbw_dir = self._get_gdbw_dir()
         environ[pp] = '%s:%s' % (ppv, gdbw_dir)
 
+    def toggle_hud(self):
+        self.hud = not self.hud
+        self.update_info()
+
+    def set_latency(self, seconds):
+        self.latency = seconds
+        if self.hud:
+            self.update_info()
+
     def update_info(self):
-        self.info.set_info('[ gdbw console / style:%s ]' % self.app.style_name)
+        info = '[ gdbw console / style:%s ]' % self.app.style_name
+        if self.hud and self.latency is not None:
+            info += ' [ stop-to-paint %.1fms ]' % (self.latency * 1000)
+        self.info.set_info(info)
         
         
             
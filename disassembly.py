@@ -1,8 +1,6 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-from re import search, split
-
 from prompt_toolkit.buffer import Buffer
 from prompt_toolkit.document import Document
 from prompt_toolkit.filters import Condition
@@ -11,24 +9,20 @@ from prompt_toolkit.layout.containers import ConditionalContainer, Window, HSpli
 from prompt_toolkit.layout.controls import BufferControl, FormattedTextControl
 from prompt_toolkit.layout import Dimension, ScrollOffsets
 from prompt_toolkit.lexers.base import Lexer
-from prompt_toolkit.lexers import PygmentsLexer
 from prompt_toolkit.layout.margins import NumberedMargin
-from pygments.styles import get_style_by_name
 from prompt_toolkit.styles import style_from_pygments_cls
 from prompt_toolkit.styles.named_colors import NAMED_COLORS as colors
 from prompt_toolkit.widgets import Box,Frame,Shadow
 
-from pygments.lexers import get_lexer_by_name, CObjdumpLexer
-
+from highlighter import shared_lexer
 from infoline import InfoLine
 
 class DisassemblyLexer(Lexer):
     def __init__(self, window):
         self.window = window
-        self.lexer = PygmentsLexer(CObjdumpLexer, sync_from_start=False)
 
     def lex_document(self, document):
-        lexer_lex_line = self.lexer.lex_document(document)
+        lexer_lex_line = shared_lexer('c-objdump').lex_document(document)
         def fixup(t):
             return t.replace('/', '$').replace('^', '#')
         def lex_line(lineno):
@@ -47,8 +41,17 @@ class DisassemblyWindow:
         self.show = show
         self.cursor_line = 0
         self.lexer = DisassemblyLexer(self)
+        self.record = None
+        # (address, address string, formatted text) of each instruction.
+        self.insns = []
+        self.rows = {}
+        # (address, before) of the instructions asked of gdbwhelper.
+        self.requested = None
+        self.lines_sent = None
+        self.updating = False
         self.buffer = Buffer(document=Document(),
                              multiline=True)
+        self.buffer.on_cursor_position_changed += self._cursor_moved
         self.control = BufferControl(buffer=self.buffer,
                                      focusable=True,
                                      lexer=self.lexer,
@@ -63,8 +66,8 @@ class DisassemblyWindow:
             content=HSplit([self.info.get_ui(), self.window]),
             filter=Condition(lambda: self.show))
 
-    def log(self, msg):
-        self.app.log(msg)
+    def log(self, msg, *args):
+        self.app.log(msg, *args)
         
     def get_ui(self):
         return self.container
@@ -72,30 +75,66 @@ class DisassemblyWindow:
     def toggle_show(self):
         self.show = not self.show
 
+    def register(self, router):
+        router.register('disassembly', self.handle_disassembly)
+        router.register('disassembly-more', self.handle_disassembly_more)
+
     def reset(self):
         self.cursor_line = 0
+        self.record = None
+        self.insns = []
+        self.rows = {}
+        self.requested = None
         self.buffer.text = ''
-        
-    def handle_disassemble(self, output):
-        m = search('Dump of assembler code for function (.+):', output)
-        if m:
-            self.info.set_info('[ Disassembly for function %s ]' % m[1])
-
-        output = output.replace('$', '/').replace('#', '^')
-        lines = output.replace('\t', ' ').split('\n')
-        lines = lines[1:-2]
-        cursor_line = 0
-        for i in range(0, len(lines)):
-            line = lines[i]
-            if line.startswith('=>'):
-                cursor_line = i
-            addr = line[3:3+18]
-            if self.app.has_breakpoint(addr):
-                line = 'X ' + line
-            else:
-                line = '  ' + line
-            lines[i] = line
+
+    def _format(self, addr, asm):
+        line = '0x%016x <+%d>: %s' % (addr, addr - self.record['start'],
+                                      asm.replace('\t', ' '))
+        return (addr, '0x%016x' % addr,
+                line.replace('$', '/').replace('#', '^'))
+
+    def _set_insns(self, insns):
+        self.insns = insns
+        self.rows = dict((insns[i][0], i) for i in range(0, len(insns)))
+
+    def _render(self):
+        # Formatted instructions are kept; only the $pc and breakpoint
+        # markers are worked out again.
+        pc = self.record['pc']
+        has_breakpoint = self.app.has_breakpoint
+        lines = [('X ' if has_breakpoint(address) else '  ') +
+                 ('=> ' if addr == pc else '   ') + text
+                 for (addr, address, text) in self.insns]
         self.buffer.text = '\n'.join(lines) + '\n'
+
+    def _height(self):
+        render_info = self.window.render_info
+        return render_info.window_height if render_info else 22
+
+    def handle_disassembly(self, record):
+        if not record:
+            self.reset()
+            return
+        if record['insns'] is None:
+            # Same instructions as before; only $pc moved.
+            if not self.record or self.record['start'] != record['start'] \
+               or record['pc'] not in self.rows:
+                self.log('*** Disassembly out of sync')
+                self.reset()
+                self.app.console.send('gdbw-disassembly-reset')
+                return
+            self.record['pc'] = record['pc']
+        else:
+            self.info.set_info('[ Disassembly for function %s ]' %
+                               record['func'])
+            self.record = record
+            self._set_insns([self._format(addr, asm)
+                             for (addr, asm) in record['insns']])
+
+        self.requested = None
+        self.updating = True
+        self._render()
+        cursor_line = self.rows.get(record['pc'], 0)
         self.log('*** Disassembly here')
         render_info = self.window.render_info
         if render_info:
@@ -106,10 +145,56 @@ class DisassemblyWindow:
                 self._set_cursor(cursor_line+height)
         else:
             self._set_cursor(cursor_line)
+        self.updating = False
+
+        # Keep the window around $pc a couple of panes tall.
+        lines = 3 * self._height()
+        if lines != self.lines_sent:
+            self.lines_sent = lines
+            self.app.console.send('gdbw-disassembly-lines %d' % lines)
+
+    def handle_disassembly_more(self, record):
+        # Only instructions next to those shown are merged; gdbwhelper
+        # makes the same check.
+        if record and self.requested == (record['addr'], record['before']):
+            self.requested = None
+        if not record or not self.insns:
+            return
+        (first, last) = (self.insns[0][0], self.insns[-1][0])
+        if record['addr'] != (first if record['before'] else last):
+            return
+        insns = [self._format(addr, asm) for (addr, asm) in record['insns']]
+        if record['before']:
+            self.record['top'] = record['end']
+            count = len(insns)
+            self._set_insns(insns + self.insns)
+        else:
+            self.record['bottom'] = record['end']
+            count = 0
+            self._set_insns(self.insns + insns)
+        row = self.buffer.document.cursor_position_row + count
+        self.updating = True
+        self._render()
+        self._set_cursor(row)
+        self.updating = False
+
+    def _cursor_moved(self, buffer):
+        # Fetch more instructions when the cursor gets close to either end
+        # of the window.
+        if self.updating or not self.insns or self.requested:
+            return
+        row = buffer.document.cursor_position_row
+        page = self._height()
+        if row < page and not self.record['top']:
+            self.requested = (self.insns[0][0], True)
+            self.app.console.send('gdbw-disassemble 0x%x %d' %
+                                  (self.insns[0][0], -page))
+        elif row >= len(self.insns) - page and not self.record['bottom']:
+            self.requested = (self.insns[-1][0], False)
+            self.app.console.send('gdbw-disassemble 0x%x %d' %
+                                  (self.insns[-1][0], page))
 
     def _set_cursor(self, line):
-        self.log('*** Disassembly cursor Line %d' % (line))
+        self.log('*** Disassembly cursor Line %d', line)
         pos = self.buffer.document.translate_row_col_to_index(line, 0)
         self.buffer.cursor_position = pos
-        
-        
@@ -18,9 +18,6 @@ from prompt_toolkit.styles.named_colors import NAMED_COLORS as colors
 from prompt_toolkit.widgets import Box,Frame,VerticalLine
 
 
-from pygments.lexers import CLexer
-from pygments.styles import get_style_by_name
-
 from infoline import InfoLine
 
 
@@ -2,37 +2,38 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-from subprocess import call
-from sys import exit
+from importlib.util import find_spec
+from sys import argv, exit, stderr
 
-# Check and automatically install prerequisites.
-try:
-    import prompt_toolkit
-    import pygments
-    import ptterm
-except:
-    try:
-        print('Installing prerequisites...')
-        print('Installing pygments...')
-        call('pip3 install pygments', shell=True)
-        print('Installing prompt_toolkit...')
-        call('pip3 install prompt_toolkit', shell=True)
-        print('Installing ptterm...')
-        call('pip3 install ptterm', shell=True)
+# Prints where startup time went when gdbw exits. Not passed on to gdb.
+PROFILE_STARTUP = '--profile-startup'
 
-        import prompt_toolkit
-        import pygments
-        import ptterm
-    except:
-        print('Could not install prerequisited.')
-        print('Install pygments, prompt_toolkit and ptterm via pip.')
-        exit(1)
-
-from application import Application
+# Check for prerequisites. Only look for them here; they are imported, and
+# timed by --profile-startup, in main.
+missing = [m for m in ['prompt_toolkit', 'pygments', 'ptterm']
+           if not find_spec(m)]
+if missing:
+    print('Missing prerequisites: %s.' % ', '.join(missing))
+    print('Install them via pip: pip3 install %s' % ' '.join(missing))
+    exit(1)
 
 def main():
+    profile = None
+    if PROFILE_STARTUP in argv:
+        argv.remove(PROFILE_STARTUP)
+        from startup import StartupProfile
+        profile = StartupProfile()
+
+    from application import Application
+    if profile:
+        profile.mark('imports')
     app = Application()
+    if profile:
+        profile.mark('Application()')
+        profile.watch(app)
     app.run()
+    if profile:
+        print(profile.report(), file=stderr)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,70 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+from json import dumps, loads
+from os import (X_OK, access, environ, getpid, makedirs, pathsep, replace,
+                stat)
+from os.path import dirname, expanduser, join, realpath
+from shutil import which
+
+def _state_path():
+    state = environ.get('XDG_STATE_HOME') or expanduser('~/.local/state')
+    return join(state, 'gdbw', 'gdb.json')
+
+def _mtime(d):
+    try:
+        return stat(d).st_mtime_ns
+    except:
+        return None
+
+def _search(script):
+    # The first gdb on PATH that is not script (gdbw's own gdb), as found
+    # on PATH, and the directories looked at with their mtimes. Directories
+    # after the one gdb is found in cannot change the result.
+    dirs = []
+    for d in environ.get('PATH', '').split(pathsep):
+        dirs.append([d, _mtime(d)])
+        g = which('gdb', path=d or '.')
+        if g and realpath(g) != script:
+            return (g, dirs)
+    return (None, dirs)
+
+def find_gdb(script):
+    '''
+    Path of the gdb to run: GDBW_GDB if set, else the first gdb on PATH
+    other than script. The result of searching PATH is saved in a per-user
+    state file and reused while PATH and the mtimes of the directories
+    searched stay the same. It is saved unresolved, and symlinks resolved
+    at every launch, since they may be re-pointed (e.g by
+    update-alternatives) without any directory on PATH changing.
+    '''
+    if environ.get('GDBW_GDB'):
+        return environ['GDBW_GDB']
+
+    path = _state_path()
+    try:
+        with open(path) as f:
+            state = loads(f.read())
+        if state['PATH'] == environ.get('PATH', '') and \
+           state['script'] == script and \
+           all(_mtime(d) == mtime for (d, mtime) in state['dirs']) and \
+           access(state['gdb'], X_OK) and realpath(state['gdb']) != script:
+            return realpath(state['gdb'])
+    except:
+        pass
+
+    (gdb, dirs) = _search(script)
+    if gdb:
+        try:
+            makedirs(dirname(path), exist_ok=True)
+            state = {'PATH': environ.get('PATH', ''), 'script': script,
+                     'dirs': dirs, 'gdb': gdb}
+            # Write and rename so that concurrent launches never read a
+            # partial file.
+            tmp = '%s.%d' % (path, getpid())
+            with open(tmp, 'w') as f:
+                f.write(dumps(state))
+            replace(tmp, path)
+        except:
+            pass
+    return realpath(gdb) if gdb else None
@@ -4,7 +4,13 @@
 
 # Intended to be sourced from GDB.
 import gdb
+from json import dumps
 from os import environ
+from os.path import abspath
+from sys import exc_info
+from time import monotonic
+
+import records
 from namedpipe import NamedPipe
 
 def pretty(msg):
@@ -14,58 +20,255 @@ def pprint(msg):
     gdb.write(pretty(msg) + '\n')
     gdb.flush()
 
+# Disassembles a window around $pc unless GDBW_DISASSEMBLY=function.
+disassembler = records.Disassembler(
+    None if environ.get('GDBW_DISASSEMBLY') == 'function' else 64)
+
+# Frames of the backtrace are fetched a page at a time.
+callstack = records.Callstack()
+
+# Only registers that changed are sent.
+registers = records.Registers()
+
+# Arguments and locals, expanded on request.
+arguments = records.Variables(True)
+local_variables = records.Variables(False)
+variables = {'args': arguments, 'locals': local_variables}
+
+# Frames are looked up only for the threads shown.
+threads = records.Threads()
+
+# Records refreshed at every prompt, in order, along with the panes that
+# consume them. Records with no panes are always sent.
+RECORDS = [
+    # Threads can be notified anywhere.
+    ('threads', threads.record, ['threads']),
+
+    # Notify frame change first
+    ('frame', records.current_frame, []),
+
+    # Determine if program has been (re)run
+    ('inferior', records.inferior, []),
+
+    # Breakpoint must come before source and disassembly
+    ('breakpoints', records.BreakpointTracker().record,
+     ['breakpoints', 'source', 'disassembly']),
+
+    # Args and Locals
+    ('args', arguments.record, ['argsnlocals']),
+    ('locals', local_variables.record, ['argsnlocals']),
+
+    # Disassembly
+    ('disassembly', disassembler.record, ['disassembly']),
+    ('callstack', callstack.record, ['callstack']),
+    ('registers', registers.record, ['registers']),
+]
+
 def main():
-    
-    def prompt_hook(current_prompt):
-        # Threads can be notified anywhere.
-        post_command('info threads')
-        
-        # Notify frame change first 
-        post_command('info frame')
-        
-        # Determine if program has been (re)run
-        post_command('info inferiors')
-
-        # Breakpoint must come before source and disassembly
-        post_command('info breakpoints')
-
-        # Args and Locals
-        post_command('info args')
-        post_command('info locals')
-        
-        # Disassembly
-        post_command('disassemble')
-        post_command('bt 64')
-        post_command('info registers all')
+    # Panes shown by gdbw. None until gdbw tells us; refresh everything then.
+    visible = None
+
+    # Incremented at every prompt; tags snapshots sent to gdbw. Snapshots
+    # posted for an older prompt are stale by the time they run.
+    stop_seq = 0
 
+    def is_needed(panes, shown):
+        if not panes or shown is None:
+            return True
+        return any(p in shown for p in panes)
+
+    def refresh(shown, update=None, stop=False):
+        # update, if given, changes the state records are made from. It runs
+        # on gdb's thread, like the records, even if the snapshot is stale.
+        needed = [(key, fn) for (key, fn, panes) in RECORDS
+                  if is_needed(panes, shown)]
+        snapshot = make_snapshot(stop_seq, needed, stop)
+        if update:
+            def update_and_snapshot():
+                update()
+                snapshot()
+            gdb.post_event(update_and_snapshot)
+        else:
+            gdb.post_event(snapshot)
+
+    def prompt_hook(current_prompt):
+        nonlocal stop_seq
+        stop_seq += 1
+        refresh(visible, stop=True)
         return current_prompt.replace('(gdb) ', pretty('(gdb) '))
 
-    def log(msg):
+    def handle_show(args):
+        nonlocal visible
+        shown = set(args)
+        previous = visible
+        visible = shown
+        if previous is not None:
+            # Fill panes that have just been toggled on.
+            added = shown - previous
+            if added:
+                refresh(added)
+
+    def handle_disassembly_lines(args):
+        # Size of the window around $pc; follows the height of the pane.
+        lines = max(int(args[0]), 16)
+        def update():
+            if disassembler.lines is not None:
+                disassembler.lines = lines
+        gdb.post_event(update)
+
+    def handle_disassemble(args):
+        (addr, count) = (int(args[0], 0), int(args[1]))
+        more = lambda frame: disassembler.more(addr, count)
+        gdb.post_event(make_snapshot(stop_seq, [('disassembly-more', more)]))
+
+    def handle_callstack_lines(args):
+        lines = max(int(args[0]), 8)
+        def update():
+            callstack.lines = lines
+        gdb.post_event(update)
+
+    def handle_callstack(args):
+        (level, count) = (int(args[0]), int(args[1]))
+        more = lambda frame: callstack.more(level, count)
+        gdb.post_event(make_snapshot(stop_seq, [('callstack-more', more)]))
+
+    def handle_callstack_reset(args):
+        refresh(set(['callstack']), callstack.reset)
+
+    def handle_registers(args):
+        # Switch register group, or send all the registers again.
+        update = lambda: registers.set_group(args[0] if args
+                                             else registers.group)
+        refresh(set(['registers']), update)
+
+    def handle_expand(args):
+        # gdbw-expand args|locals <count> <name> <child index>...
+        path = [args[2]] + [int(i) for i in args[3:]]
+        expand = lambda: variables[args[0]].expand(path, int(args[1]))
+        refresh(set(['argsnlocals']), expand)
+
+    def handle_threads(args):
+        # gdbw-threads <num>...: the threads shown.
+        nums = set(int(num) for num in args)
+        def update():
+            threads.visible = nums
+        gdb.post_event(update)
+        details = lambda frame: {'details': threads.details(frame, nums)}
+        gdb.post_event(make_snapshot(stop_seq, [('threads-details', details)]))
+
+    def handle_disassembly_reset(args):
+        # gdbw lost track of the instructions it has; send them again.
+        def reset():
+            disassembler.sent = None
+        refresh(set(['disassembly']), reset)
+
+    requests = {
+        'gdbw-show': handle_show,
+        'gdbw-disassembly-lines': handle_disassembly_lines,
+        'gdbw-disassemble': handle_disassemble,
+        'gdbw-disassembly-reset': handle_disassembly_reset,
+        'gdbw-callstack-lines': handle_callstack_lines,
+        'gdbw-callstack': handle_callstack,
+        'gdbw-callstack-reset': handle_callstack_reset,
+        'gdbw-registers': handle_registers,
+        'gdbw-expand': handle_expand,
+        'gdbw-threads': handle_threads,
+    }
+
+    def handle_request(payload):
+        msg = str(payload, 'utf-8')
+        args = msg.split()
+        if args and args[0] in requests:
+            log('request "%s"', msg)
+            requests[args[0]](args[1:])
+        else:
+            post_command(msg)
+
+    def log(msg, *args):
         if log_pipe:
+            if args:
+                msg = msg % args
             log_pipe.write(str(msg) + '\n')
 
+    def execute(cmd):
+        log('executing "%s"', cmd)
+        result = gdb.execute(cmd, from_tty=False, to_string = True)
+        log('result = %s', result)
+        return result
+
     def make_command(cmd):
         def execute_cmd():
             try:
-                log('executing "%s"' % (cmd))
-                result = gdb.execute(cmd, from_tty=False, to_string = True)
-                log('result = ' + result)
-                response = '%s\n%s' % (cmd, result)
+                response = '%s\n%s' % (cmd, execute(cmd))
                 out_pipe.write(response)
                 log('wrote obj to gdbw pipe.')
             except:
                 pass
         return execute_cmd
 
+    def make_snapshot(seq, needed, stop=False):
+        # Gather the records for a stop and send them as a single message
+        # so that gdbw can apply them at once. Times of each stage go along
+        # for gdbw's latency stats; stop tells gdbw that the snapshot is
+        # that of a stop, rather than an answer to one of its requests.
+        requested = monotonic()
+        def execute_snapshot():
+            if seq != stop_seq:
+                log('dropped stale snapshot %d.', seq)
+                return
+            times = {'requested': requested, 'started': monotonic()}
+            snapshot = {}
+            frame = records.selected_frame()
+            for (key, fn) in needed:
+                start = monotonic()
+                try:
+                    snapshot[key] = fn(frame)
+                except:
+                    log('could not get %s: %s', key, exc_info()[1])
+                times[key] = monotonic() - start
+            start = monotonic()
+            body = dumps(snapshot, separators=(',', ':'))
+            times['json'] = monotonic() - start
+            if stop:
+                times['stop'] = True
+            # Added last, so that 'sent' comes after the records are
+            # serialized.
+            times['sent'] = monotonic()
+            body = '%s%s"times":%s}' % (body[:-1], ',' if snapshot else '',
+                                        dumps(times, separators=(',', ':')))
+            try:
+                out_pipe.write('snapshot %d\n%s' % (seq, body))
+                log('wrote snapshot %d to gdbw pipe.', seq)
+            except:
+                pass
+        return execute_snapshot
+
     def post_command(cmd):
         gdb.post_event(make_command(cmd))
 
+    class LatencyCommand(gdb.Command):
+        '''
+        Write gdbw's stop-to-paint latency percentiles, by stage, to FILE
+        (gdbw-latency.txt by default).
+        Usage: gdbw-latency [FILE]
+        '''
+        def __init__(self):
+            super(LatencyCommand, self).__init__('gdbw-latency',
+                                                 gdb.COMMAND_SUPPORT)
+
+        def invoke(self, arg, from_tty):
+            path = abspath(arg.strip() or 'gdbw-latency.txt')
+            out_pipe.write('latency %s' % path)
+            pprint('Writing latency percentiles to %s.' % path)
+
     var = 'GDBW_PIPES'
     try:
         pipes = environ[var].split()
         in_pipe = NamedPipe(pipes[0])
         out_pipe = NamedPipe(pipes[1])
-        log_pipe = NamedPipe(pipes[2]) if len(pipes) == 3 else None
+        log_pipe = None
+        if len(pipes) == 3:
+            log_pipe = NamedPipe(pipes[2], framed=False)
         pprint('Talking to gdbw via (%s, %s).' % (pipes[0], pipes[1]))
         if log_pipe:
             pprint('Logging to %s.' % log_pipe.path)
@@ -77,7 +280,9 @@ def main():
     gdb.execute('set pagination off')
     
     pprint('Starting command listener...')
-    in_pipe.begin_reading(callback=post_command)
+    in_pipe.begin_reading(callback=handle_request, error_callback=log)
+
+    LatencyCommand()
 
     pprint('Overriding GDB prompt...')    
     gdb.prompt_hook = prompt_hook
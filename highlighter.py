@@ -0,0 +1,197 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+from bisect import bisect_left, bisect_right
+from os import environ
+from queue import Queue
+from re import compile
+from threading import Thread
+
+from prompt_toolkit.formatted_text.utils import split_lines
+from prompt_toolkit.lexers import PygmentsLexer
+from prompt_toolkit.lexers.base import Lexer
+from prompt_toolkit.styles.pygments import pygments_token_to_classname
+
+# Lines that start with one of these characters at column 0 begin a top
+# level construct (declaration, preprocessor directive, closing brace) and
+# are safe points to start lexing from, unless inside a block comment.
+SYNC = compile(r'[A-Za-z_#}]')
+COMMENT = compile(r'/\*|\*/|//')
+
+class _Worker:
+    '''A single background thread shared by all highlighters.'''
+    def __init__(self):
+        self.queue = Queue()
+        self.thread = None
+
+    def post(self, task):
+        if not self.thread:
+            self.thread = Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+        self.queue.put(task)
+
+    def _run(self):
+        while True:
+            task = self.queue.get()
+            try:
+                task()
+            except:
+                pass
+
+_worker = _Worker()
+
+# Lexers shared by the panes, by pygments name (e.g c).
+_lexers = {}
+
+def shared_lexer(name):
+    '''
+    The PygmentsLexer for the pygments lexer called name. Created, and the
+    pygments lexer imported, the first time a pane is drawn with it.
+    '''
+    lexer = _lexers.get(name)
+    if not lexer:
+        from pygments.lexers import find_lexer_class_by_name
+        lexer = PygmentsLexer(find_lexer_class_by_name(name),
+                              sync_from_start=False)
+        _lexers[name] = lexer
+    return lexer
+
+class ViewportLexer(Lexer):
+    '''
+    Highlights a source file a chunk at a time. A line is lexed along with
+    the lines around it, from the closest sync point before it up to a sync
+    point after it, instead of from the start (or a sync point) to the end
+    of the file. Sync points are found with a line index built in the
+    background. Neighbouring chunks are lexed ahead of time in the
+    background. Files larger than max_bytes (GDBW_HIGHLIGHT_MAX_MB) are
+    shown as plain text.
+    '''
+    # Lines lexed around the requested line.
+    CHUNK_LINES = 200
+
+    # Never lex more than this many lines before/after the requested line.
+    MAX_LINES = 1000
+
+    # Chunks lexed ahead, in each direction, in the background.
+    READ_AHEAD = 2
+
+    def __init__(self, pygments_lexer, lines, size, max_bytes=None):
+        '''
+        lines is the list of lines to highlight, or anything that supports
+        len(), iteration, indexing and slicing like one. size is the size of
+        the text.
+        '''
+        if max_bytes is None:
+            max_bytes = int(environ.get('GDBW_HIGHLIGHT_MAX_MB', '32')) << 20
+        self.pygments_lexer = pygments_lexer
+        self.lines = lines
+        self.plain = not pygments_lexer or size > max_bytes
+        self.tokens = {}
+        self.styles = {}
+        self.sync_points = None
+        if not self.plain:
+            _worker.post(self._build_index)
+
+    def size(self):
+        return len(self.tokens)
+
+    def lex_document(self, document):
+        # Buffer creates a new Document whenever the cursor moves; documents
+        # with the same text share the same lines.
+        if document.lines is not self.lines:
+            lines = document.lines
+            return lambda lineno: [('', lines[lineno])]
+        return self.lex_line
+
+    def lex_line(self, lineno):
+        if self.plain:
+            return [('', self.lines[lineno])]
+        try:
+            return self.tokens[lineno]
+        except KeyError:
+            pass
+        (start, end) = self._chunk(lineno)
+        self._lex(start, end)
+        _worker.post(lambda: self._read_ahead(start, end))
+        return self.tokens.get(lineno, [])
+
+    def _build_index(self):
+        points = []
+        in_comment = False
+        for (i, line) in enumerate(self.lines):
+            if not in_comment and SYNC.match(line):
+                points.append(i)
+            if '/' in line:
+                for m in COMMENT.finditer(line):
+                    if m[0] == '/*' and not in_comment:
+                        in_comment = True
+                    elif m[0] == '*/' and in_comment:
+                        in_comment = False
+                    elif m[0] == '//' and not in_comment:
+                        break
+        self.sync_points = points
+
+    def _sync_before(self, lineno):
+        lowest = max(0, lineno - self.MAX_LINES)
+        points = self.sync_points
+        if points is not None:
+            p = bisect_right(points, lineno) - 1
+            return points[p] if p >= 0 and points[p] >= lowest else lowest
+        # Index not ready yet; scan backwards.
+        lines = self.lines
+        for i in range(lineno, lowest - 1, -1):
+            if SYNC.match(lines[i]):
+                return i
+        return lowest
+
+    def _sync_after(self, lineno):
+        count = len(self.lines)
+        highest = min(count, lineno + self.MAX_LINES)
+        points = self.sync_points
+        if points is not None:
+            p = bisect_left(points, lineno)
+            return points[p] if p < len(points) and points[p] < highest \
+                else highest
+        lines = self.lines
+        for i in range(lineno, highest):
+            if SYNC.match(lines[i]):
+                return i
+        return highest
+
+    def _chunk(self, lineno):
+        start = self._sync_before(lineno)
+        end = self._sync_after(max(lineno + 1, start + self.CHUNK_LINES))
+        return (start, end)
+
+    def _read_ahead(self, start, end):
+        count = len(self.lines)
+        for i in range(0, self.READ_AHEAD):
+            if end >= count:
+                break
+            (s, end) = self._chunk(end)
+            if end - 1 not in self.tokens:
+                self._lex(s, end)
+        for i in range(0, self.READ_AHEAD):
+            if start <= 0:
+                break
+            (start, e) = self._chunk(start - 1)
+            if start not in self.tokens:
+                self._lex(start, e)
+
+    def _style(self, token):
+        try:
+            return self.styles[token]
+        except KeyError:
+            style = 'class:' + pygments_token_to_classname(token)
+            self.styles[token] = style
+            return style
+
+    def _lex(self, start, end):
+        text = '\n'.join(self.lines[start:end])
+        fragments = [(self._style(t), v) for (_, t, v) in
+                     self.pygments_lexer.get_tokens_unprocessed(text)]
+        tokens = self.tokens
+        for (i, line) in enumerate(split_lines(fragments), start):
+            if i < end:
+                tokens[i] = line
@@ -12,7 +12,6 @@ from prompt_toolkit.layout.controls import BufferControl
 from prompt_toolkit.layout import Dimension, ScrollOffsets
 from prompt_toolkit.lexers.base import Lexer
 from prompt_toolkit.layout.margins import NumberedMargin
-from pygments.styles import get_style_by_name
 from prompt_toolkit.styles import style_from_pygments_cls
 from prompt_toolkit.styles.named_colors import NAMED_COLORS as colors
 from prompt_toolkit.widgets import Box,Frame,VerticalLine
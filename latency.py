@@ -0,0 +1,75 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+from bisect import bisect_left
+from threading import Lock
+
+class Histogram:
+    '''
+    Counts of durations in buckets that grow by 25% from 10us up, so that
+    memory stays fixed however many samples are recorded. Percentiles are
+    given as the upper bound of the bucket they fall in (at most the
+    largest sample).
+    '''
+    BOUNDS = [1e-5 * 1.25 ** i for i in range(0, 80)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        rank = p * self.count / 100.0
+        seen = 0
+        for (i, n) in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                if i < len(self.BOUNDS):
+                    return min(self.BOUNDS[i], self.max)
+                return self.max
+        return 0.0
+
+class Latency:
+    '''
+    Durations of each stage between gdb stopping and gdbw painting the
+    result, as histograms by stage name. Stages of gdbwhelper are prefixed
+    with gdb:, those of pane handlers with pane:.
+    '''
+    PERCENTILES = [50, 90, 99]
+
+    def __init__(self):
+        self.histograms = {}
+        # Recorded on the event loop, dumped from the pipe's reader thread.
+        self.lock = Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if not histogram:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.record(seconds)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            f.write(self.report())
+
+    def report(self):
+        # A table of the percentiles of each stage, in milliseconds.
+        with self.lock:
+            lines = ['%-28s %8s %9s' % ('stage', 'count', 'mean') +
+                     ''.join(' %9s' % ('p%d' % p) for p in self.PERCENTILES) +
+                     ' %9s' % 'max']
+            for (stage, h) in sorted(self.histograms.items()):
+                ms = [h.percentile(p) * 1000 for p in self.PERCENTILES]
+                lines.append('%-28s %8d %9.3f' % (stage, h.count,
+                                                  h.total * 1000 / h.count) +
+                             ''.join(' %9.3f' % m for m in ms) +
+                             ' %9.3f' % (h.max * 1000))
+        return '# milliseconds\n' + '\n'.join(lines) + '\n'
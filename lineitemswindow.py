@@ -3,25 +3,21 @@
 
 from prompt_toolkit.layout import Dimension
 from prompt_toolkit.lexers.base import Lexer
-from prompt_toolkit.lexers import PygmentsLexer
-
-from pygments.lexers import CLexer
 
+from highlighter import shared_lexer
 from window import Window
 
 class LineItemsLexer(Lexer):
     def __init__(self, window):
         self.window = window
-        self.lexer = PygmentsLexer(CLexer, sync_from_start=False)
         super(LineItemsLexer, self).__init__()
 
 
     def lex_document(self, document):
-        lexer_lex_line = self.lexer.lex_document(document)
+        lexer_lex_line = shared_lexer('c').lex_document(document)
         def lex_line(lineno):
             parts = lexer_lex_line(lineno)
-            changed = self.window.changed
-            if lineno < len(changed) and changed[lineno]:
+            if lineno in self.window.changed:
                 parts = [('bold fg:Olive', t) for (s, t) in parts]
             return parts
         return lex_line
@@ -35,7 +31,8 @@ class LineItemsWindow(Window):
                  height=Dimension(preferred=1)):
         self.lexer = LineItemsLexer(self)
         self.lines = []
-        self.changed = []
+        # Lines that changed at the last update.
+        self.changed = set()
 
         super(LineItemsWindow, self).__init__(app=app,
                                               show=show,
@@ -44,15 +41,14 @@ class LineItemsWindow(Window):
                                               height=height)
 
 
-    def handle_output(self, output):
-        self.changed = [False] * 100
-        lines = [' ' + l for l in output.strip().split('\n')]
-        for i in range(0, len(lines)):
-            self.changed[i] = i < len(self.lines) and lines[i] != self.lines[i]
+    def handle_lines(self, lines, changed):
+        # changed is the set of lines to highlight.
+        lines = [' ' + l for l in lines]
+        self.changed = changed
         self.lines = lines
         self.buffer.text = '\n'.join(lines)
 
     def reset(self):
         self.lines = []
-        self.changed = []
+        self.changed = set()
         self.buffer.text = ''
@@ -0,0 +1,44 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+from threading import Lock
+
+class LoopQueue:
+    '''
+    Hands items posted from other threads to an asyncio event loop.
+    Items posted before the loop is attached, or while a drain is already
+    scheduled, are passed together to a single call of callback.
+    '''
+    def __init__(self, callback):
+        self.callback = callback
+        self.items = []
+        self.lock = Lock()
+        self.loop = None
+        self.scheduled = False
+
+    def attach(self, loop):
+        with self.lock:
+            self.loop = loop
+            self._schedule()
+
+    def detach(self):
+        with self.lock:
+            self.loop = None
+
+    def put(self, item):
+        with self.lock:
+            self.items.append(item)
+            self._schedule()
+
+    def _schedule(self):
+        if self.loop and self.items and not self.scheduled:
+            self.scheduled = True
+            self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        with self.lock:
+            items = self.items
+            self.items = []
+            self.scheduled = False
+        if items:
+            self.callback(items)
@@ -0,0 +1,178 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+from array import array
+from itertools import accumulate, islice
+from os import O_RDONLY, close, open, pread
+
+from prompt_toolkit.data_structures import Point
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout.controls import UIContent, UIControl
+
+class MappedSource:
+    '''
+    A large source file, indexed by line. Lines are read (with pread) and
+    decoded, and tabs expanded, only when asked for, so the memory used
+    depends on the lines being displayed rather than the size of the file.
+    The file is not memory-mapped: build steps often rewrite generated
+    sources in place, and touching a mapping past the end of a truncated
+    file kills the process. Lines past the end read as empty. Supports
+    len(), iteration, indexing and slicing like a list of lines.
+    '''
+    # Bytes read at a time when building the line index.
+    BLOCK_SIZE = 1 << 20
+
+    # Bytes read at a time when reading lines.
+    READ_SIZE = 1 << 14
+
+    # Only the start of every STRIDE'th line is indexed; other lines are
+    # found by scanning forward from there.
+    STRIDE = 64
+
+    def __init__(self, path):
+        self.fd = open(path, O_RDONLY)
+        self._index()
+
+    def _index(self):
+        # offsets[k] is where line k*STRIDE starts.
+        offsets = array('Q', [0])
+        newlines = 0
+        start = 0
+        while True:
+            block = pread(self.fd, self.BLOCK_SIZE, start)
+            if not block:
+                break
+            lines = block.split(b'\n')
+            # Start of the line after each newline in the block.
+            starts = accumulate([len(l) + 1 for l in lines[:-1]],
+                                initial=start)
+            first = self.STRIDE - newlines % self.STRIDE
+            offsets.extend(islice(starts, first, None, self.STRIDE))
+            newlines += len(lines) - 1
+            start += len(block)
+        self.offsets = offsets
+        self.count = newlines + 1
+        self.length = start
+
+    def __len__(self):
+        return self.count
+
+    def _raw(self, pos):
+        # The lines from file offset pos on, undecoded.
+        buf = b''
+        at = 0
+        while True:
+            end = buf.find(b'\n', at)
+            while end < 0:
+                data = pread(self.fd, self.READ_SIZE, pos + len(buf))
+                if not data:
+                    end = len(buf)
+                    break
+                # Drop the lines already read.
+                pos += at
+                buf = buf[at:] + data
+                at = 0
+                end = buf.find(b'\n', len(buf) - len(data))
+            yield buf[at:end]
+            at = end + 1
+
+    def _read(self, start, stop):
+        if start >= stop:
+            return iter(())
+        skip = start % self.STRIDE
+        lines = islice(self._raw(self.offsets[start // self.STRIDE]),
+                       skip, skip + stop - start)
+        return (line.decode('utf-8', 'replace').rstrip('\r')
+                .replace('\t', '    ') for line in lines)
+
+    def _lines(self, start, stop):
+        return list(self._read(start, stop))
+
+    def __iter__(self):
+        # Reads on from each line instead of finding every line from the
+        # nearest indexed one, as indexing would.
+        return self._read(0, len(self))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            (start, stop, step) = i.indices(len(self))
+            lines = self._lines(start, stop)
+            return lines[::step] if step != 1 else lines
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        return self._lines(i, i + 1)[0]
+
+    def size(self):
+        return self.length
+
+    def close(self):
+        close(self.fd)
+
+class MappedSourceControl(UIControl):
+    '''
+    Displays a MappedSource. Only the lines in view are read and lexed.
+    '''
+    def __init__(self):
+        self.source = None
+        self.lex_line = None
+        self.cursor_line = 0
+        # Lines in view, for paging.
+        self.height = 1
+
+    def set_source(self, source, lexer):
+        self.source = source
+        self.lex_line = lexer.lex_line
+        self.cursor_line = 0
+
+    def is_focusable(self):
+        return True
+
+    def create_content(self, width, height):
+        if not self.source:
+            return UIContent()
+        count = len(self.source)
+        self.height = max(1, height)
+        self.cursor_line = max(0, min(self.cursor_line, count - 1))
+        return UIContent(get_line=self.lex_line,
+                         line_count=count,
+                         cursor_position=Point(x=0, y=self.cursor_line),
+                         show_cursor=False)
+
+    def move_cursor_down(self):
+        self.cursor_line += 1
+
+    def move_cursor_up(self):
+        self.cursor_line = max(0, self.cursor_line - 1)
+
+    def get_key_bindings(self):
+        # The default bindings move the cursor of the current buffer, which
+        # this control does not have. cursor_line is kept in range by
+        # create_content.
+        kb = KeyBindings()
+        @kb.add('down')
+        def _(event):
+            self.move_cursor_down()
+
+        @kb.add('up')
+        def _(event):
+            self.move_cursor_up()
+
+        @kb.add('pagedown')
+        def _(event):
+            self.cursor_line += self.height
+
+        @kb.add('pageup')
+        def _(event):
+            self.cursor_line = max(0, self.cursor_line - self.height)
+
+        @kb.add('home')
+        def _(event):
+            self.cursor_line = 0
+
+        @kb.add('end')
+        def _(event):
+            if self.source:
+                self.cursor_line = len(self.source) - 1
+        return kb
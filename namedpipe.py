@@ -1,14 +1,112 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-from os import (close, getpid, mkfifo, open, read, write, unlink,
-                O_RDONLY, O_RDWR)
-from sys import exit
-from threading import Thread
+from io import FileIO
+from os import (close, getpid, mkfifo, open, pipe, read, write, unlink,
+                O_NONBLOCK, O_RDONLY, O_RDWR)
+from selectors import DefaultSelector, EVENT_READ
+from struct import Struct
+from sys import exc_info, exit
+from threading import Thread, current_thread
+
+# Each frame is a little-endian 32 bit payload length followed by the payload.
+HEADER = Struct('<I')
+
+class FrameReader:
+    '''
+    Reassembles length-prefixed frames from a file descriptor.
+    Bytes are read straight into a preallocated buffer which only grows
+    when a single frame does not fit. Frames are handed out as memoryviews
+    into that buffer and are valid only until the callback returns.
+    '''
+    def __init__(self, size=64*1024):
+        self._allocate(size)
+        self.start = 0
+        self.end = 0
+
+    def _allocate(self, size):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+    def _make_room(self, needed):
+        pending = self.end - self.start
+        if needed > len(self.buffer):
+            old = self.view
+            self._allocate(max(needed, 2 * len(self.buffer)))
+            self.view[:pending] = old[self.start:self.end]
+            old.release()
+        elif self.start > 0:
+            self.view[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+    def pending(self):
+        return self.end - self.start
+
+    def read(self, f, callback):
+        '''
+        Reads whatever is available from f (a raw file with readinto) and
+        passes each complete frame to callback. Returns the number of bytes
+        read, 0 at EOF or None if f is non-blocking and has no data.
+        '''
+        needed = self._needed()
+        if self.start + needed > len(self.buffer):
+            self._make_room(needed)
+        n = f.readinto(self.view[self.end:])
+        if n:
+            self.end += n
+            self._deliver(callback)
+        return n
+
+    def _needed(self):
+        pending = self.end - self.start
+        if pending < HEADER.size:
+            return HEADER.size
+        (size,) = HEADER.unpack_from(self.buffer, self.start)
+        return HEADER.size + size
+
+    def _deliver(self, callback):
+        while True:
+            needed = self._needed()
+            if self.end - self.start < needed:
+                break
+            frame = self.view[self.start + HEADER.size:self.start + needed]
+            self.start += needed
+            try:
+                callback(frame)
+            finally:
+                frame.release()
+        if self.start == self.end:
+            self.start = self.end = 0
+
+class FrameRecorder:
+    '''
+    Passes frames on to callback after appending them, in the same
+    length-prefixed framing, to the file at path. Recordings can be
+    replayed with benchmarks/replay.py.
+    '''
+    def __init__(self, path, callback):
+        self.f = FileIO(path, 'w')
+        self.callback = callback
+
+    def __call__(self, frame):
+        if not self.f.closed:
+            self.f.write(HEADER.pack(len(frame)))
+            self.f.write(frame)
+        self.callback(frame)
+
+    def close(self):
+        self.f.close()
 
 class NamedPipe:
-    def __init__(self, name):
+    '''
+    A fifo carrying length-prefixed frames. Payloads may be str or any
+    bytes-like object. Pipes created with framed=False carry raw text and
+    are meant to be read by tools like cat (e.g log pipes).
+    '''
+    def __init__(self, name, framed=True):
         self.path = name
+        self.framed = framed
         self.fd = None
         self.t = None
         try:
@@ -16,44 +114,110 @@ class NamedPipe:
         except:
             pass
 
-    def begin_reading(self, callback):
+    def begin_reading(self, callback, error_callback=None):
+        '''
+        Starts a thread that calls callback with the payload of each frame,
+        as a memoryview that is valid only during the call. Exceptions
+        raised by callback (e.g decode errors) and pipe errors are passed
+        to error_callback. When the writer goes away, the thread waits for
+        the next writer. Call stop_reading to end the thread.
+        '''
+        def report(msg):
+            if error_callback:
+                error_callback(msg)
+
+        def deliver(frame):
+            try:
+                callback(frame)
+            except:
+                report('%s: could not handle frame: %s' %
+                       (self.path, exc_info()[1]))
+
+        def read_until_eof(selector):
+            # Returns True at EOF, False when reading should stop.
+            try:
+                # Non-blocking open so that stop_reading can interrupt the
+                # wait for a writer.
+                fd = open(self.path, O_RDONLY | O_NONBLOCK)
+            except:
+                report('%s: %s' % (self.path, exc_info()[1]))
+                return False
+            f = FileIO(fd, closefd=False)
+            frames = FrameReader()
+            selector.register(fd, EVENT_READ)
+            try:
+                while True:
+                    keys = [key.fd for (key, _) in selector.select()]
+                    if self.wakeup[0] in keys:
+                        return False
+                    if frames.read(f, deliver) == 0:
+                        break
+            except:
+                report('%s: %s' % (self.path, exc_info()[1]))
+                return False
+            finally:
+                selector.unregister(fd)
+                close(fd)
+            if frames.pending():
+                report('%s: writer closed mid-frame; dropped %d bytes.' %
+                       (self.path, frames.pending()))
+            return True
+
         def reader():
-            self.fd = open(self.path, O_RDONLY)
-            buffer = b''
-            while True:
-                try:                                        
-                    p = buffer.find(b'\0')
-                    if p >= 0:
-                        chunk = buffer[0:p].decode('utf-8')
-                        buffer = buffer[p+1:]
-                        if chunk != '':                    
-                            callback(chunk)
-                        continue
-                    buffer += read(self.fd, 4096)
-                except:
-                    pass
-        if not self.fd:            
+            selector = DefaultSelector()
+            selector.register(self.wakeup[0], EVENT_READ)
+            # Wait for the next writer after each EOF.
+            while read_until_eof(selector):
+                pass
+            selector.close()
+
+        if not self.t:
+            self.wakeup = pipe()
             self.t = Thread(target=reader)
             self.t.daemon = True
             self.t.start()
 
+    def stop_reading(self):
+        if self.t:
+            write(self.wakeup[1], b'\0')
+            if self.t is not current_thread():
+                self.t.join()
+            close(self.wakeup[0])
+            close(self.wakeup[1])
+            self.t = None
+
     def write(self, obj):
         if not self.fd:
             self.fd = open(self.path, O_RDWR)
-        write(self.fd, str(obj).encode('utf-8'))
-        write(self.fd, b'\0')
+        if isinstance(obj, str):
+            obj = obj.encode('utf-8')
+        data = memoryview(obj).cast('B')
+        if self.framed:
+            self._write_all(HEADER.pack(len(data)))
+        self._write_all(data)
+
+    def _write_all(self, data):
+        while len(data):
+            n = write(self.fd, data)
+            data = data[n:]
 
     def close(self):
+        try:
+            self.stop_reading()
+        except:
+            pass
         try:
             if self.fd:
                 close(self.fd)
         except:
             pass
+        # The fd number may be reused by then.
+        self.fd = None
         try:
             unlink(self.path)
         except:
             pass
-        
+
     def __del__(self):
         self.close()
 
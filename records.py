@@ -0,0 +1,793 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+# Structured records for gdbw panes, extracted via the gdb Python API.
+# Intended to be imported from gdbwhelper.py inside GDB.
+import gdb
+from collections import OrderedDict, deque
+from itertools import islice
+from os.path import basename
+
+BREAKPOINT_TYPES = {
+    'BP_BREAKPOINT': 'breakpoint',
+    'BP_HARDWARE_BREAKPOINT': 'hw breakpoint',
+    'BP_WATCHPOINT': 'watchpoint',
+    'BP_HARDWARE_WATCHPOINT': 'hw watchpoint',
+    'BP_READ_WATCHPOINT': 'read watchpoint',
+    'BP_ACCESS_WATCHPOINT': 'acc watchpoint',
+    'BP_CATCHPOINT': 'catchpoint',
+}
+
+SCALAR_TYPES = [getattr(gdb, c) for c in ['TYPE_CODE_INT', 'TYPE_CODE_PTR',
+                                          'TYPE_CODE_FLAGS', 'TYPE_CODE_ENUM',
+                                          'TYPE_CODE_BOOL', 'TYPE_CODE_CHAR']
+                if hasattr(gdb, c)]
+
+def selected_frame():
+    try:
+        return gdb.selected_frame()
+    except gdb.error:
+        return None
+
+def frame_level(frame):
+    if hasattr(frame, 'level'):
+        return frame.level()
+    level = 0
+    frame = frame.newer()
+    while frame:
+        level += 1
+        frame = frame.newer()
+    return level
+
+def frame_address(frame):
+    # Stack pointer of the caller, i.e the canonical frame address. Unlike
+    # the frame's own sp, it is stable for the lifetime of the frame.
+    try:
+        older = frame.older()
+        return int((older or frame).read_register('sp'))
+    except (gdb.error, ValueError):
+        return frame.pc()
+
+def frame_key(frame):
+    # Identifies a frame in the backtrace: its pc, its frame address and its
+    # caller's pc. The pc and frame address of the newest frame alone are
+    # the same when a function stops at the same place, at the same depth,
+    # after being called from somewhere else.
+    older = frame.older()
+    return (frame.pc(), frame_address(frame), older.pc() if older else None)
+
+def location(frame):
+    rec = {'func': frame.name() or '??', 'pc': frame.pc()}
+    sal = frame.find_sal()
+    if sal.symtab:
+        rec['file'] = sal.symtab.filename
+        rec['path'] = sal.symtab.fullname()
+        rec['line'] = sal.line
+    return rec
+
+def function_block(frame):
+    try:
+        block = frame.block()
+    except RuntimeError:
+        return None
+    while block and not block.function:
+        block = block.superblock
+    return block
+
+def format_value(value):
+    try:
+        return value.format_string()
+    except gdb.error as e:
+        return '<error: %s>' % e
+
+def inferior(frame):
+    inf = gdb.selected_inferior()
+    return {'num': inf.num, 'pid': inf.pid}
+
+def current_frame(frame):
+    if not frame:
+        return None
+    rec = location(frame)
+    rec['level'] = frame_level(frame)
+    rec['addr'] = frame_address(frame)
+    return rec
+
+def breakpoint(b):
+    typ = 'breakpoint'
+    for (name, desc) in BREAKPOINT_TYPES.items():
+        if b.type == getattr(gdb, name, None):
+            typ = desc
+    rec = {'num': b.number,
+           'type': typ,
+           'enabled': b.enabled,
+           'what': b.location or b.expression or '',
+           'hits': b.hit_count,
+           'locs': []}
+    if hasattr(b, 'locations'):
+        for loc in b.locations:
+            l = {'addr': loc.address, 'func': loc.function or ''}
+            if loc.source:
+                l['file'] = basename(loc.source[0])
+                l['path'] = loc.fullname or loc.source[0]
+                l['line'] = loc.source[1]
+            rec['locs'].append(l)
+    elif b.location:
+        try:
+            sals = gdb.decode_line(b.location)[1] or []
+        except gdb.error:
+            sals = []
+        for sal in sals:
+            l = {'addr': sal.pc, 'func': ''}
+            if sal.symtab:
+                l['file'] = sal.symtab.filename
+                l['path'] = sal.symtab.fullname()
+                l['line'] = sal.line
+            rec['locs'].append(l)
+    return rec
+
+def breakpoints(frame):
+    return [breakpoint(b) for b in gdb.breakpoints()]
+
+class BreakpointTracker:
+    '''
+    Tracks breakpoint changes via gdb.events so that only the breakpoints
+    created, modified or deleted since the last record are sent:
+    {'changed': [records], 'deleted': [numbers]}. The full list is sent as
+    {'full': [records]} the first time and whenever the process changes,
+    since hit counts are reset on (re)run without a modified event.
+    '''
+    def __init__(self):
+        # Breakpoints changed since the last record, by number. None for
+        # deleted breakpoints.
+        self.pending = {}
+        self.pid = None
+        gdb.events.breakpoint_created.connect(self._changed)
+        gdb.events.breakpoint_modified.connect(self._changed)
+        gdb.events.breakpoint_deleted.connect(self._deleted)
+
+    def _changed(self, b):
+        self.pending[b.number] = b
+
+    def _deleted(self, b):
+        self.pending[b.number] = None
+
+    def record(self, frame):
+        pid = gdb.selected_inferior().pid
+        if pid != self.pid:
+            recs = breakpoints(frame)
+            self.pid = pid
+            self.pending = {}
+            return {'full': recs}
+
+        changed = []
+        deleted = []
+        for (num, b) in sorted(self.pending.items()):
+            if b and b.is_valid():
+                changed.append(breakpoint(b))
+            else:
+                deleted.append(num)
+        self.pending = {}
+        return {'changed': changed, 'deleted': deleted}
+
+class Threads:
+    '''
+    The threads of the selected inferior. The thread list is kept up to
+    date with gdb.events rather than listed at every stop, and only the
+    threads gdbw shows (plus the selected thread) are switched to and have
+    their frame looked up. Records hold the threads created and exited since
+    the last record, or the whole list as 'full' the first time and when the
+    process changes, along with 'details' of the threads shown:
+    {'added': [[num, target]], 'removed': [nums], 'selected': num,
+     'details': [records]}.
+    '''
+    def __init__(self):
+        # Threads by number, and those created or exited since the last
+        # record.
+        self.threads = {}
+        self.added = {}
+        self.removed = set()
+        self.pid = None
+        # Threads gdbw shows.
+        self.visible = set()
+        gdb.events.new_thread.connect(self._new_thread)
+        gdb.events.exited.connect(self._exited)
+        self.exit_events = hasattr(gdb.events, 'thread_exited')
+        if self.exit_events:
+            gdb.events.thread_exited.connect(self._thread_exited)
+
+    def _new_thread(self, event):
+        t = event.inferior_thread
+        if t.inferior == gdb.selected_inferior():
+            self.added[t.num] = t
+
+    def _thread_exited(self, event):
+        num = event.inferior_thread.num
+        if self.added.pop(num, None) is None and num in self.threads:
+            self.removed.add(num)
+
+    def _exited(self, event):
+        self.pid = None
+
+    def record(self, frame):
+        inf = gdb.selected_inferior()
+        full = inf.pid != self.pid
+        if full:
+            self.threads = dict((t.num, t) for t in inf.threads())
+            rec = {'full': [[t.num, target(t)] for t in
+                            sorted(self.threads.values(), key=lambda t: t.num)]}
+        else:
+            if not self.exit_events:
+                self.removed.update(num for (num, t) in self.threads.items()
+                                    if not t.is_valid())
+            for num in self.removed:
+                self.threads.pop(num, None)
+            added = [t for t in self.added.values() if t.is_valid()]
+            self.threads.update((t.num, t) for t in added)
+            rec = {'added': [[t.num, target(t)] for t in added],
+                   'removed': sorted(self.removed)}
+
+        selected = gdb.selected_thread()
+        rec['selected'] = selected.num if selected else None
+        nums = set(self.visible)
+        if selected:
+            nums.add(selected.num)
+        rec['details'] = self.details(frame, nums)
+        # Only now is the record sure to be sent; until then the same
+        # changes are sent again.
+        if full:
+            self.pid = inf.pid
+        self.added = {}
+        self.removed = set()
+        return rec
+
+    def details(self, frame, nums):
+        # A record for each of nums, so that gdbw does not ask again for
+        # threads that have exited or cannot be read.
+        recs = []
+        selected = gdb.selected_thread()
+        if not selected:
+            return recs
+        try:
+            for num in sorted(nums):
+                rec = {'num': num, 'name': ''}
+                t = self.threads.get(num)
+                if not t or not t.is_valid():
+                    rec['func'] = '(exited)'
+                    recs.append(rec)
+                    continue
+                try:
+                    rec['name'] = t.name or ''
+                    if t.is_running():
+                        rec['func'] = '(running)'
+                    else:
+                        t.switch()
+                        rec.update(location(gdb.newest_frame()))
+                except gdb.error as e:
+                    rec['func'] = '<error: %s>' % e
+                recs.append(rec)
+        finally:
+            # Switching threads resets the selected frame.
+            selected.switch()
+            if frame:
+                frame.select()
+        return recs
+
+def target(thread):
+    (pid, lwp, tid) = thread.ptid
+    return 'LWP %d' % lwp if lwp else 'process %d' % pid
+
+def symbols(frame, is_args):
+    # Arguments or local variables of frame, innermost scope first.
+    syms = []
+    block = frame.block() if frame else None
+    seen = set()
+    while block:
+        for sym in block:
+            if sym.name in seen:
+                continue
+            if sym.is_argument if is_args else sym.is_variable:
+                seen.add(sym.name)
+                syms.append(sym)
+        if block.function:
+            break
+        block = block.superblock
+    return syms
+
+def has_children(value):
+    try:
+        printer = gdb.default_visualizer(value)
+        if printer:
+            return hasattr(printer, 'children')
+        t = value.type.strip_typedefs()
+        if t.code == gdb.TYPE_CODE_PTR:
+            target = t.target().strip_typedefs().code
+            return target not in [gdb.TYPE_CODE_VOID, gdb.TYPE_CODE_FUNC] \
+                and int(value) != 0
+        return t.code in [gdb.TYPE_CODE_ARRAY, gdb.TYPE_CODE_STRUCT,
+                          gdb.TYPE_CODE_UNION]
+    except gdb.error:
+        return False
+
+def children(value, start, count):
+    '''
+    (name, value) of children start to start+count-1 of value, and whether
+    there are more. Children come from the value's pretty printer if it has
+    one, and only the children asked for are produced.
+    '''
+    printer = gdb.default_visualizer(value)
+    if printer:
+        if not hasattr(printer, 'children'):
+            return ([], False)
+        kids = list(islice(printer.children(), start, start + count + 1))
+        kids = [(name, v if isinstance(v, gdb.Value) else gdb.Value(v))
+                for (name, v) in kids]
+        return (kids[:count], len(kids) > count)
+    t = value.type.strip_typedefs()
+    if t.code == gdb.TYPE_CODE_PTR:
+        return ([('*', value.dereference())] if start == 0 else [], False)
+    if t.code == gdb.TYPE_CODE_ARRAY:
+        (low, high) = t.range()
+        first = low + start
+        last = min(high + 1, first + count)
+        return ([('[%d]' % i, value[i]) for i in range(first, last)],
+                last <= high)
+    if t.code in [gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION]:
+        fields = t.fields()
+        return ([(f.name or '<anonymous>', value[f])
+                 for f in fields[start:start + count]],
+                start + count < len(fields))
+    return ([], False)
+
+class Variables:
+    '''
+    The arguments or the local variables of a frame, as a tree that is
+    expanded on request. Values are summarized with a bounded number of
+    elements and nesting levels, so large arrays and containers cost the
+    same as small ones. Each node is [name, summary, expandable], followed
+    by {'nodes': [nodes], 'more': bool} if it is expanded.
+
+    Nodes are expanded by path: the name of the variable followed by the
+    index of each child. Expanded nodes show a bounded number of children,
+    raised a page at a time with expand(). They are remembered per frame,
+    identified by (function, frame address) like gdbw does, for the FRAMES
+    frames recorded last, and forgotten when the process changes.
+    '''
+    # Elements of arrays and containers shown in a summary.
+    SUMMARY_ELEMENTS = 16
+
+    # Children shown when a node is expanded, and added per page.
+    CHILDREN = 50
+
+    # Frames whose expanded nodes are remembered.
+    FRAMES = 64
+
+    def __init__(self, is_args):
+        self.is_args = is_args
+        self.pid = None
+        # Expanded nodes of each frame recently recorded; most recent last.
+        self.frames = OrderedDict()
+        # Number of children shown, by path of expanded nodes, in the frame
+        # recorded last.
+        self.expanded = {}
+
+    def _select(self, frame):
+        pid = gdb.selected_inferior().pid
+        if pid != self.pid:
+            self.pid = pid
+            self.frames = OrderedDict()
+        key = (frame.name() or '??', frame_address(frame)) if frame else None
+        self.expanded = self.frames.pop(key, {})
+        self.frames[key] = self.expanded
+        if len(self.frames) > self.FRAMES:
+            self.frames.popitem(last=False)
+
+    def expand(self, path, count):
+        # Shows count children of the node at path, in the frame recorded
+        # last; 0 collapses it.
+        path = tuple(path)
+        if count:
+            self.expanded[path] = count
+        else:
+            for p in list(self.expanded):
+                if p[:len(path)] == path:
+                    del self.expanded[p]
+
+    def record(self, frame):
+        self._select(frame)
+        nodes = []
+        try:
+            syms = symbols(frame, self.is_args)
+        except RuntimeError:
+            return nodes
+        for sym in syms:
+            try:
+                value = sym.value(frame)
+            except gdb.error as e:
+                nodes.append([sym.name, '<error: %s>' % e, False])
+                continue
+            nodes.append(self._node((sym.name,), sym.name, value))
+        return nodes
+
+    def _node(self, path, name, value):
+        try:
+            summary = value.format_string(max_elements=self.SUMMARY_ELEMENTS,
+                                          max_depth=1)
+        except gdb.error as e:
+            summary = '<error: %s>' % e
+        node = [name, summary, has_children(value)]
+        count = self.expanded.get(path)
+        if count and node[2]:
+            try:
+                (kids, more) = children(value, 0, count)
+            except gdb.error as e:
+                (kids, more) = ([('<error>', gdb.Value(str(e)))], False)
+            node.append({'nodes': [self._node(path + (i,), n, v)
+                                   for (i, (n, v)) in enumerate(kids)],
+                         'more': more})
+        return node
+
+class Listing:
+    '''
+    The instructions of a function decoded so far: a contiguous run that is
+    extended on demand in either direction. top and bottom are set once the
+    run reaches the start or end of the function.
+    '''
+    def __init__(self, insns, top, bottom):
+        self.insns = insns
+        self.top = top
+        self.bottom = bottom
+        self._index()
+
+    def _index(self):
+        self.index = dict((addr, i) for (i, (addr, asm))
+                          in enumerate(self.insns))
+
+    def prepend(self, insns):
+        self.insns = insns + self.insns
+        self._index()
+
+    def append(self, insns):
+        for (addr, asm) in insns:
+            self.index[addr] = len(self.insns)
+            self.insns.append([addr, asm])
+
+class Disassembler:
+    '''
+    Disassembles a window of instructions around $pc rather than the whole
+    function, so that the cost of a stop does not depend on the size of the
+    function. The window holds lines instructions, or the whole function if
+    lines is None (GDBW_DISASSEMBLY=function). More instructions are fetched
+    with more() as gdbw scrolls.
+
+    Decoded instructions are cached per function start address and process
+    until an objfile is loaded. Stops within the instructions gdbw already
+    has send no instructions at all; gdbw only moves the $pc marker.
+    '''
+    # Longest instruction, in bytes, of the architectures we care about.
+    MAX_INSN_SIZE = 16
+
+    # Number of functions kept decoded.
+    CACHE_SIZE = 64
+
+    def __init__(self, lines=64):
+        self.lines = lines
+        # (arch, start, end) and listing of the current function.
+        self.func = None
+        self.listing = None
+        # Listings by (pid, function start).
+        self.cache = OrderedDict()
+        # (cache key, first address, last address) of the instructions
+        # gdbw has.
+        self.sent = None
+        gdb.events.new_objfile.connect(self.clear)
+        if hasattr(gdb.events, 'clear_objfiles'):
+            gdb.events.clear_objfiles.connect(self.clear)
+
+    def clear(self, event=None):
+        self.cache.clear()
+        self.listing = None
+        self.sent = None
+
+    def record(self, frame):
+        if not frame:
+            self.func = self.listing = self.sent = None
+            return None
+        pc = frame.pc()
+        block = function_block(frame)
+        (low, high) = (block.start, block.end) if block else (None, None)
+        self.func = (frame.architecture(), low, high)
+
+        key = (gdb.selected_inferior().pid, low) if block else None
+        listing = self.cache.get(key)
+        if listing and pc in listing.index:
+            self.cache.move_to_end(key)
+        else:
+            listing = self._decode(pc)
+            if key:
+                self.cache[key] = listing
+                if len(self.cache) > self.CACHE_SIZE:
+                    self.cache.popitem(last=False)
+        self.listing = listing
+
+        rec = {'func': frame.name() or '??',
+               'start': low if low is not None else pc,
+               'pc': pc}
+        if key and self.sent and self.sent[0] == key and \
+           self.sent[1] <= pc <= self.sent[2]:
+            # gdbw already has the instructions around pc.
+            rec['insns'] = None
+            return rec
+
+        if self.lines is None:
+            (first, last) = (0, len(listing.insns))
+        else:
+            i = listing.index[pc]
+            before = self.lines // 3
+            i += self._extend(i, -before)
+            self._extend(i, self.lines - before)
+            (first, last) = (max(0, i - before), i + self.lines - before)
+        insns = listing.insns[first:last]
+        rec['top'] = listing.top and first == 0
+        rec['bottom'] = listing.bottom and last >= len(listing.insns)
+        rec['insns'] = insns
+        self.sent = (key, insns[0][0], insns[-1][0]) if insns else None
+        return rec
+
+    def more(self, addr, count):
+        '''
+        count instructions following the one at addr, or preceding it if
+        count is negative.
+        '''
+        listing = self.listing
+        if not listing or addr not in listing.index:
+            return None
+        i = listing.index[addr]
+        i += self._extend(i, count)
+        if count < 0:
+            first = max(0, i + count)
+            insns = listing.insns[first:i]
+            end = listing.top and first == 0
+        else:
+            last = i + 1 + count
+            insns = listing.insns[i + 1:last]
+            end = listing.bottom and last >= len(listing.insns)
+        if self.sent and insns:
+            # Only instructions next to those gdbw has are added to them.
+            (key, first_addr, last_addr) = self.sent
+            if count < 0 and addr == first_addr:
+                self.sent = (key, insns[0][0], last_addr)
+            elif count > 0 and addr == last_addr:
+                self.sent = (key, first_addr, insns[-1][0])
+        return {'addr': addr,
+                'before': count < 0,
+                'end': end,
+                'insns': insns}
+
+    def _decode(self, pc):
+        (arch, low, high) = self.func
+        if self.lines is not None:
+            return Listing(self._after(pc, 1), False, False)
+        if low is None:
+            return Listing(self._after(pc, 64), True, True)
+        return Listing([[i['addr'], i['asm']] for i in
+                        self._disassemble(low, high - 1)], True, True)
+
+    def _extend(self, i, count):
+        # Makes sure the listing has count instructions after the one at
+        # index i, or before it if count is negative. Returns how much i
+        # moved by.
+        listing = self.listing
+        (arch, low, high) = self.func
+        if count < 0 and i + count < 0 and not listing.top:
+            needed = -(i + count)
+            insns = self._before(listing.insns[0][0], needed)
+            listing.prepend(insns)
+            listing.top = len(insns) < needed or \
+                          (low is not None and insns[0][0] == low)
+            return len(insns)
+        if count > 0 and i + count >= len(listing.insns) and \
+           not listing.bottom:
+            needed = i + count + 1 - len(listing.insns)
+            insns = self._after(listing.insns[-1][0], needed + 1)[1:]
+            listing.append(insns)
+            listing.bottom = len(insns) < needed
+        return 0
+
+    def _disassemble(self, start, end=None, count=None):
+        (arch, low, high) = self.func
+        if high is not None:
+            end = min(end, high - 1) if end is not None else high - 1
+        try:
+            if end is None:
+                return arch.disassemble(start, count=count)
+            if count is None:
+                return arch.disassemble(start, end)
+            return arch.disassemble(start, end, count)
+        except gdb.MemoryError:
+            return []
+
+    def _after(self, addr, count):
+        return [[i['addr'], i['asm']] for i in
+                self._disassemble(addr, count=count)]
+
+    def _before(self, addr, count):
+        # Instructions can't be decoded backwards. Decode forward from a
+        # point far enough back, preferably the start of the function, and
+        # keep the instructions that end exactly at addr.
+        (arch, low, high) = self.func
+        span = count * self.MAX_INSN_SIZE
+        if low is not None and addr - low <= span:
+            starts = [low]
+        else:
+            first = addr - span
+            if low is not None:
+                first = max(first, low)
+            starts = range(first, first + self.MAX_INSN_SIZE)
+        for start in starts:
+            if start >= addr:
+                break
+            insns = self._disassemble(start, addr - 1)
+            if insns and insns[-1]['addr'] + insns[-1]['length'] == addr:
+                return [[i['addr'], i['asm']] for i in insns[-count:]]
+        return []
+
+class Callstack:
+    '''
+    The backtrace, a page at a time. Only the frames gdbw shows are walked,
+    and their arguments are not formatted. gdbw asks for more frames with
+    more() as it scrolls.
+
+    Frames are identified by frame_key(). At each stop, frames are
+    walked from the newest one only until one that gdbw already has is
+    found; it and the frames older than it are unchanged. The record holds
+    just the changed frames and the number of older frames gdbw keeps:
+    {'frames': [records], 'keep': count, 'more': bool}.
+    '''
+    def __init__(self, lines=32):
+        # Frames per page.
+        self.lines = lines
+        self.reset()
+
+    def reset(self):
+        # Keys of the frames gdbw has, oldest first, and their positions.
+        # Positions grow towards newer frames and are never reused, so
+        # frames can be added at either end without renumbering.
+        self.keys = deque()
+        self.positions = {}
+        self.oldest = 0
+        self.newest = -1
+        # Whether there are frames older than those gdbw has.
+        self.older = False
+
+    def record(self, frame):
+        count = self.lines
+        if frame:
+            # Make sure the selected frame is in the page.
+            count = max(count, frame_level(frame) + self.lines // 2)
+        try:
+            f = gdb.newest_frame()
+        except gdb.error:
+            self.reset()
+            return {'frames': [], 'keep': 0, 'more': False}
+
+        recs = []
+        keys = []
+        while f and len(recs) < count:
+            key = frame_key(f)
+            if key in self.positions:
+                # This frame and older ones are unchanged.
+                keep = self.positions[key] - self.oldest + 1
+                while self.keys[-1] != key:
+                    del self.positions[self.keys.pop()]
+                    self.newest -= 1
+                self._push(keys)
+                return {'frames': recs, 'keep': keep, 'more': self.older}
+            rec = location(f)
+            rec['level'] = len(recs)
+            recs.append(rec)
+            keys.append(key)
+            f = f.older()
+
+        self.reset()
+        self._push(keys)
+        self.older = f is not None
+        return {'frames': recs, 'keep': 0, 'more': self.older}
+
+    def _push(self, keys):
+        # Adds keys, newest first, as the newest frames.
+        for key in reversed(keys):
+            self.newest += 1
+            self.positions[key] = self.newest
+            self.keys.append(key)
+
+    def more(self, level, count):
+        recs = []
+        try:
+            f = gdb.newest_frame()
+        except gdb.error:
+            return {'level': level, 'frames': recs, 'more': False}
+        for i in range(0, level):
+            f = f and f.older()
+        # Frames next to those gdbw has are added to them, by gdbw too.
+        adjacent = level == len(self.keys)
+        while f and len(recs) < count:
+            rec = location(f)
+            rec['level'] = level + len(recs)
+            recs.append(rec)
+            if adjacent:
+                self.oldest -= 1
+                key = frame_key(f)
+                self.positions[key] = self.oldest
+                self.keys.appendleft(key)
+            f = f.older()
+        if adjacent:
+            self.older = f is not None
+        return {'level': level, 'frames': recs, 'more': f is not None}
+
+# Register groups that can be shown, in the order c-x g cycles through.
+REGISTER_GROUPS = ['general', 'float', 'vector', 'system', 'all']
+
+class Registers:
+    '''
+    The registers of the selected frame in one register group. Only the
+    registers whose value changed since the last record are formatted and
+    sent: {'group': name, 'changed': [[name, hex, natural]]}. Every register
+    of the group is sent, as 'full' instead of 'changed', the first time,
+    after the group changes and whenever the process changes.
+    '''
+    def __init__(self, group='general'):
+        self.group = group
+        # Register names by (architecture, group).
+        self.names = {}
+        self.reset()
+
+    def reset(self):
+        # Raw value of each register sent.
+        self.values = {}
+        self.pid = None
+
+    def set_group(self, group):
+        self.group = group
+        self.reset()
+
+    def record(self, frame):
+        if not frame:
+            return None
+        arch = frame.architecture()
+        key = (arch.name(), self.group)
+        names = self.names.get(key)
+        if names is None:
+            names = [reg.name for reg in arch.registers(self.group)]
+            self.names[key] = names
+
+        pid = gdb.selected_inferior().pid
+        full = pid != self.pid
+        if full:
+            self.values = {}
+            self.pid = pid
+        recs = []
+        for name in names:
+            try:
+                value = frame.read_register(name)
+                scalar = value.type.strip_typedefs().code in SCALAR_TYPES
+                # Compare raw values; only format those that changed.
+                natural = None
+                if scalar:
+                    raw = int(value)
+                elif hasattr(value, 'bytes'):
+                    raw = value.bytes
+                else:
+                    raw = natural = format_value(value)
+            except (gdb.error, ValueError) as e:
+                (scalar, raw, natural) = (False, None, '<error: %s>' % e)
+            if not full and name in self.values and self.values[name] == raw:
+                continue
+            self.values[name] = raw
+            if natural is None:
+                natural = format_value(value)
+            if scalar:
+                recs.append([name, '0x%x' % (raw & 0xffffffffffffffff),
+                             natural])
+            else:
+                recs.append([name, '', natural])
+        return {'group': self.group, 'full' if full else 'changed': recs}
@@ -4,21 +4,67 @@
 from prompt_toolkit.layout import Dimension, ScrollOffsets
 
 from lineitemswindow import LineItemsWindow
-        
+
+# Register groups, in the order c-x g cycles through them. Same as
+# REGISTER_GROUPS in records.py, which can only be imported inside gdb.
+REGISTER_GROUPS = ['general', 'float', 'vector', 'system', 'all']
+
 class RegistersWindow(LineItemsWindow):
     def __init__(self,
                  app=None,
                  show=False,
                  height=Dimension(preferred=22)):
+        self.group = 'general'
+        # Row of each register.
+        self.rows = {}
         super(RegistersWindow, self).__init__(app=app,
                                               show=show,
                                               height=height,
                                               title='[ Registers ]',
                                               show_divider = self._show_divider)
 
-    def handle_info_registers(self, output):
-        self.handle_output(output)
+    def register(self, router):
+        router.register('registers', self.handle_registers)
+
+    def _format(self, name, raw, natural):
+        return ' {:<15}{:<19}{}'.format(name, raw, natural)
+
+    def handle_registers(self, record):
+        if not record:
+            self.reset()
+            return
+        self.group = record['group']
+        previously_changed = self.changed
+        self.changed = set()
+        if 'full' in record:
+            self.info.set_info('[ Registers (%s) ]' % self.group)
+            self.lines = [self._format(*rec) for rec in record['full']]
+            self.rows = dict((rec[0], i)
+                             for (i, rec) in enumerate(record['full']))
+        else:
+            for rec in record['changed']:
+                row = self.rows.get(rec[0])
+                if row is None:
+                    self.app.log('*** Registers out of sync')
+                    self.app.console.send('gdbw-registers')
+                    return
+                self.lines[row] = self._format(*rec)
+                self.changed.add(row)
+            if not self.changed and not previously_changed:
+                return
+        self.buffer.text = '\n'.join(self.lines)
         self.fit_to_height()
 
+    def next_group(self):
+        # Cycle through the register groups.
+        i = REGISTER_GROUPS.index(self.group) if self.group in \
+            REGISTER_GROUPS else -1
+        group = REGISTER_GROUPS[(i + 1) % len(REGISTER_GROUPS)]
+        self.app.console.send('gdbw-registers %s' % group)
+
+    def reset(self):
+        super(RegistersWindow, self).reset()
+        self.rows = {}
+
     def _show_divider(self):
         return self.app.source.show or self.app.disassembly.show
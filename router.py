@@ -0,0 +1,44 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+from time import perf_counter
+
+class Router:
+    '''
+    Calls the handler registered for a key, e.g the type of a message from
+    gdbwhelper or the key of a record. Counts the calls to, and the time
+    spent in, each handler. The time of each call is also recorded in
+    latency, if given, as the stage prefix + key.
+    '''
+    def __init__(self, latency=None, prefix=''):
+        self.handlers = {}
+        self.counts = {}
+        self.times = {}
+        self.latency = latency
+        self.prefix = prefix
+
+    def register(self, key, handler):
+        self.handlers[key] = handler
+        self.counts[key] = 0
+        self.times[key] = 0.0
+
+    def dispatch(self, key, *args):
+        # Returns False if no handler is registered for key.
+        handler = self.handlers.get(key)
+        if not handler:
+            return False
+        start = perf_counter()
+        try:
+            handler(*args)
+        finally:
+            elapsed = perf_counter() - start
+            self.counts[key] += 1
+            self.times[key] += elapsed
+            if self.latency:
+                self.latency.record(self.prefix + key, elapsed)
+        return True
+
+    def stats(self):
+        return ' '.join('%s=%d/%.1fms' % (key, self.counts[key],
+                                          self.times[key] * 1000)
+                        for key in sorted(self.handlers) if self.counts[key])
@@ -2,7 +2,6 @@
 # Licensed under the MIT License
 
 from os.path import basename
-from re import search
 
 from prompt_toolkit.buffer import Buffer
 from prompt_toolkit.document import Document
@@ -10,15 +9,14 @@ from prompt_toolkit.filters import Condition
 from prompt_toolkit.layout.containers import ConditionalContainer, Window, HSplit, VSplit
 from prompt_toolkit.layout.controls import BufferControl
 from prompt_toolkit.layout import Dimension, ScrollOffsets
-from prompt_toolkit.lexers import DynamicLexer, PygmentsLexer, SyntaxSync
+from prompt_toolkit.lexers import DynamicLexer
 from prompt_toolkit.layout.margins import NumberedMargin
 from prompt_toolkit.styles import style_from_pygments_cls
 from prompt_toolkit.widgets import Frame, TextArea, HorizontalLine
 
-from pygments.styles import get_style_by_name
-from pygments.lexers import GasLexer
-
 from infoline import InfoLine
+from mappedsource import MappedSourceControl
+from sourcecache import SourceCache
 
 class SourceWindow:
     default_title = "[ no source file ]"
@@ -35,12 +33,18 @@ class SourceWindow:
         self.current_line = -1
         self.handle_source_change = False
         self.lexer = None
+        self.entry = None
+        self.cache = SourceCache()
+        self.breakpoint_generation = -1
+        self.breakpoint_filename = None
+        self.breakpoint_lines = None
         self.buffer = Buffer(document=Document(),
                              multiline=True) # TODO: Intelligent readonly lambda
         self.control = BufferControl(self.buffer,
                                      focusable=True,
                                      lexer=DynamicLexer(lambda: self.lexer),
                                      focus_on_click=True)
+        self.mapped_control = MappedSourceControl()
         self.window = Window(content=self.control,
                              height=height,
                              width=width,
@@ -58,8 +62,8 @@ class SourceWindow:
     def get_ui(self):
         return self.container
 
-    def log(self, msg):
-        self.app.log(msg)
+    def log(self, msg, *args):
+        self.app.log(msg, *args)
 
     def reset(self):
         pass
@@ -67,40 +71,53 @@ class SourceWindow:
     def toggle_show(self):
         self.show = not self.show
 
-    def handle_info_frame(self, output):
-        m = search('\((.+):(\d+)\);', output)
+    def _clear(self, title):
+        self.buffer.document = Document()
+        self.window.content = self.control
+        self.entry = None
+        self.filename = None
+        self.handle_source_change = True
+        self.info.set_info(title)
 
-        if not m:            
-            self.buffer.document = Document()
-            self.filename = None
-            self.handle_source_change = True
-            self.info.set_info(self.default_title)
+    def handle_frame(self, record):
+        if not record or 'path' not in record:
+            self._clear(self.default_title)
             return
 
         self.handle_source_change = False
-        filename = m[1]
-        if filename and filename != self.filename:
-            self.log('***Opening %s\n' % (filename))
-            with open(filename, "r") as f:
-                self.info.set_info('[%s]' % filename)
-                text = f.read().replace('\t', '    ')               
-                self.lexer = PygmentsLexer.from_filename(
-                    filename,
-                    sync_from_start=False)
-                if filename.endswith('.s') or filename.endswith('.S'):
-                    self.lexer = PygmentsLexer(GasLexer,
-                                               sync_from_start=False)
-                self.buffer.text = text
-                self.basename = basename(filename)
-                self.filename = filename                
-                self.handle_source_change = True
-                self._set_cursor(0)
-                self.info.set_info('[ %s ]' % filename)
-        
+        filename = record['path']
+        try:
+            entry = self.cache.get(filename)
+        except OSError as e:
+            # e.g debug info for a library whose sources are not installed.
+            self.log('***Cannot open %s: %s', filename, e)
+            self._clear('[ %s (not found) ]' % filename)
+            return
+        except UnicodeError as e:
+            self.log('***Cannot decode %s: %s', filename, e)
+            self._clear('[ %s (not UTF-8) ]' % filename)
+            return
+        if entry is not self.entry:
+            self.log('***Opening %s (source cache %s)\n', filename, self.cache)
+            self.entry = entry
+            self.lexer = entry.lexer
+            if entry.source:
+                # Large file; only the lines in view are read.
+                self.buffer.document = Document()
+                self.mapped_control.set_source(entry.source, entry.lexer)
+                self.window.content = self.mapped_control
+            else:
+                self.buffer.document = entry.document
+                self.window.content = self.control
+            self.basename = basename(filename)
+            self.filename = filename
+            self.handle_source_change = True
+            self._set_cursor(0)
+            self.info.set_info('[ %s ]' % filename)
 
-        line = int(m[2]) - 1
+        line = record['line'] - 1
         self.current_line = line
-        self.log('*** Current line %d' % (self.current_line))
+        self.log('*** Current line %d', self.current_line)
         render_info = self.window.render_info
         if render_info and not self.handle_source_change:
             fv_line = render_info.first_visible_line()
@@ -114,15 +131,25 @@ class SourceWindow:
     def _set_title(self, title):
         self.title.text = []
     def _set_cursor(self, line):
-        self.log('*** Cursor Line %d' % (line))
+        self.log('*** Cursor Line %d', line)
+        if self.window.content is self.mapped_control:
+            self.mapped_control.cursor_line = line
+            return
         pos = self.buffer.document.translate_row_col_to_index(line, 0)
         self.buffer.cursor_position = pos
     
+    def _breakpoint_lines(self):
+        # Refetched only when the file or the breakpoints change.
+        breakpoints = self.app.breakpoints
+        if self.breakpoint_generation != breakpoints.generation or \
+           self.breakpoint_filename is not self.filename:
+            self.breakpoint_generation = breakpoints.generation
+            self.breakpoint_filename = self.filename
+            self.breakpoint_lines = breakpoints.lines_for(self.filename or '')
+        return self.breakpoint_lines
+
     def _get_line_prefix(self, line, parts):
-        loc = '%s:%d' % (self.basename, line+1)
-        loc1 = '%s:%d' % (self.filename, line+1)
-        has_breakpoint = self.app.has_breakpoint(loc1) or \
-            self.app.has_breakpoint(loc)
+        has_breakpoint = line + 1 in self._breakpoint_lines()
 
         bp = '\U0001f6d1'
         pt = '\u2b95'
@@ -0,0 +1,105 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+from collections import OrderedDict
+from os import environ, stat
+from sys import getsizeof
+
+from prompt_toolkit.document import Document
+
+from highlighter import ViewportLexer
+from mappedsource import MappedSource
+
+# Rough cost of one lexed line on top of its text.
+LEXED_LINE_SIZE = 256
+
+class SourceEntry:
+    '''
+    A source file prepared for display. Files of at least mmap_bytes
+    (GDBW_MMAP_MIN_MB) have no document; their lines are read on demand
+    from source, a MappedSource.
+    '''
+    def __init__(self, path, mtime, size, mmap_bytes):
+        self.path = path
+        self.mtime = mtime
+        if size >= mmap_bytes:
+            self.document = None
+            self.source = MappedSource(path)
+            self.text_size = 0
+            lines = self.source
+        else:
+            with open(path, 'r') as f:
+                text = f.read().replace('\t', '    ')
+            self.document = Document(text, 0)
+            self.source = None
+            self.text_size = getsizeof(text)
+            lines = self.document.lines
+        # Imported here, when the first source file is shown, as importing
+        # pygments.lexers slows startup.
+        from pygments.lexers import GasLexer, get_lexer_for_filename
+        from pygments.util import ClassNotFound
+        if path.endswith('.s') or path.endswith('.S'):
+            lexer = GasLexer()
+        else:
+            try:
+                lexer = get_lexer_for_filename(path)
+            except ClassNotFound:
+                lexer = None
+        # Keeps the lexed lines for as long as the file stays cached.
+        self.lexer = ViewportLexer(lexer, lines, size)
+
+    def size(self):
+        return self.text_size + self.lexer.size() * LEXED_LINE_SIZE
+
+    def close(self):
+        if self.source:
+            self.source.close()
+
+class SourceCache:
+    '''
+    LRU cache of prepared source files keyed by path. An entry is reloaded
+    when the file's mtime changes. Entries are evicted, least recently used
+    first, when their estimated size exceeds max_bytes. The size can be set
+    in megabytes with GDBW_SOURCE_CACHE_MB.
+    '''
+    def __init__(self, max_bytes=None, mmap_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(environ.get('GDBW_SOURCE_CACHE_MB', '64')) << 20
+        if mmap_bytes is None:
+            mmap_bytes = int(environ.get('GDBW_MMAP_MIN_MB', '16')) << 20
+        self.max_bytes = max_bytes
+        self.mmap_bytes = mmap_bytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        st = stat(path)
+        mtime = st.st_mtime_ns
+        entry = self.entries.get(path)
+        if entry and entry.mtime == mtime:
+            self.hits += 1
+            self.entries.move_to_end(path)
+            return entry
+
+        self.misses += 1
+        entry = SourceEntry(path, mtime, st.st_size, self.mmap_bytes)
+        self.entries[path] = entry
+        self.entries.move_to_end(path)
+        self.evict()
+        return entry
+
+    def size(self):
+        return sum(e.size() for e in self.entries.values())
+
+    def evict(self):
+        # Never evict the most recently used entry.
+        while len(self.entries) > 1 and self.size() > self.max_bytes:
+            self.entries.popitem(last=False)[1].close()
+
+    def __str__(self):
+        return self.stats()
+
+    def stats(self):
+        return 'hits=%d misses=%d files=%d size=%dKB' % (
+            self.hits, self.misses, len(self.entries), self.size() >> 10)
@@ -0,0 +1,95 @@
+# Copyright (c) Anand Krishnamoorthi
+# Licensed under the MIT License
+
+import builtins
+from importlib.util import resolve_name
+from sys import modules
+from threading import current_thread
+from time import perf_counter
+
+# Packages and modules listed, slowest first.
+SLOWEST = 15
+
+class StartupProfile:
+    '''
+    Times gdbw's startup (gdb --profile-startup): the stages marked with
+    mark() and, like python -X importtime, every module imported on the
+    main thread, on its own (self) and with the modules it imports.
+    '''
+    def __init__(self):
+        self.start = self.last = perf_counter()
+        self.stages = []
+        # [self, cumulative] seconds by module.
+        self.imports = {}
+        # Seconds spent importing the children of each import in progress.
+        self.stack = []
+        self.thread = current_thread()
+        self.original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = name
+        if level:
+            try:
+                module = resolve_name('.' * level + name,
+                                      globals and globals.get('__package__'))
+            except:
+                pass
+        if module in modules or current_thread() is not self.thread:
+            return self.original(name, globals, locals, fromlist, level)
+        self.stack.append(0.0)
+        start = perf_counter()
+        try:
+            result = self.original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = perf_counter() - start
+            children = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+        # Failed imports (e.g of optional modules) are not counted.
+        times = self.imports.setdefault(module, [0.0, 0.0])
+        times[0] += elapsed - children
+        times[1] += elapsed
+        return result
+
+    def mark(self, stage):
+        # Ends stage, which began at the previous mark.
+        now = perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def watch(self, app):
+        # Marks the first time app (an Application) is painted.
+        def rendered(_):
+            app.app.after_render -= rendered
+            self.mark('first render')
+        app.app.after_render += rendered
+
+    def stop(self):
+        builtins.__import__ = self.original
+
+    def report(self):
+        self.stop()
+        lines = ['gdbw startup (ms)']
+        for (stage, seconds) in self.stages:
+            lines.append('  %-48s %9.1f' % (stage, seconds * 1000))
+        lines.append('  %-48s %9.1f' % ('total',
+                                         (self.last - self.start) * 1000))
+
+        packages = {}
+        for (module, (own, _)) in self.imports.items():
+            package = module.split('.')[0]
+            (seconds, count) = packages.get(package, (0.0, 0))
+            packages[package] = (seconds + own, count + 1)
+        lines.append('imports by package (self ms, modules)')
+        slowest = sorted(packages.items(), key=lambda p: -p[1][0])
+        for (package, (seconds, count)) in slowest[:SLOWEST]:
+            lines.append('  %-48s %9.1f %6d' % (package, seconds * 1000,
+                                                count))
+
+        lines.append('slowest imports (self ms, cumulative ms)')
+        slowest = sorted(self.imports.items(), key=lambda m: -m[1][0])
+        for (module, (own, cumulative)) in slowest[:SLOWEST]:
+            lines.append('  %-48s %9.1f %9.1f' % (module, own * 1000,
+                                                  cumulative * 1000))
+        return '\n'.join(lines)
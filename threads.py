@@ -1,25 +1,25 @@
 # Copyright (c) Anand Krishnamoorthi
 # Licensed under the MIT License
 
-from re import compile, search
+from asyncio import get_running_loop
+from bisect import bisect_left, insort
 
 from prompt_toolkit.layout import Dimension, ScrollOffsets
-from prompt_toolkit.lexers import PygmentsLexer
 from prompt_toolkit.lexers.base import Lexer
 
-from pygments.lexers import get_lexer_by_name, CLexer
-from pygments.token import Token
-
+from highlighter import shared_lexer
 from window import Window
 
 class ThreadsLexer(Lexer):
-    def __init__(self):
+    def __init__(self, window):
         super(ThreadsLexer, self).__init__()
-        self.lexer = PygmentsLexer(CLexer, sync_from_start=False)
+        self.window = window
 
     def lex_document(self, document):
-        lexer_lex_line = self.lexer.lex_document(document)
+        lexer_lex_line = shared_lexer('c').lex_document(document)
         def lex_line(lineno):
+            # Only the lines shown are lexed.
+            self.window.shown(lineno)
             line = document.lines[lineno]
             if len(document.lines)> 1 and len(line) > 1 and line[1] != ' ':
                 parts = lexer_lex_line(lineno)
@@ -35,11 +35,30 @@ class ThreadsLexer(Lexer):
         return lex_line
 
 class ThreadsWindow(Window):
+    '''
+    Lists every thread, but shows the name and location only of threads
+    that have been on screen since the last stop. Those are asked of
+    gdbwhelper as they are scrolled into view.
+    '''
     def __init__(self,
                  app=None,
                  show=False,
                  height=Dimension(preferred=5)):
-        self.lexer = ThreadsLexer()
+        self.lexer = ThreadsLexer(self)
+        # Thread numbers in order, and the target id of each thread.
+        self.nums = []
+        self.targets = {}
+        # Names and locations of the threads shown, by number.
+        self.details = {}
+        self.selected = None
+        # Thread number of each line.
+        self.rows = []
+        # Threads shown during the current render, and whether any of them
+        # has no details.
+        self.viewport = set()
+        self.missing = False
+        # Threads asked about since the last stop; not asked about again.
+        self.requested = set()
         scroll_offsets = ScrollOffsets(top=5,
                                        bottom=5)
         super(ThreadsWindow, self).__init__(app=app,
@@ -47,29 +66,83 @@ class ThreadsWindow(Window):
                                             title='[ Threads ]',
                                             scroll_offsets=scroll_offsets)
 
-    def handle_info_threads(self, output):
+    def register(self, router):
+        router.register('threads', self.handle_threads)
+        router.register('threads-details', self.handle_thread_details)
+
+    def handle_threads(self, record):
+        if 'full' in record:
+            self.nums = [num for (num, target) in record['full']]
+            self.targets = dict(record['full'])
+        else:
+            for num in record['removed']:
+                if self.targets.pop(num, None) is not None:
+                    del self.nums[bisect_left(self.nums, num)]
+            for (num, target) in record['added']:
+                if num not in self.targets:
+                    insort(self.nums, num)
+                self.targets[num] = target
+        self.selected = record['selected']
+        # Details of other threads are stale once the program has run.
+        self.details = dict((rec['num'], rec) for rec in record['details'])
+        self.requested = set()
+        self._render(self.selected)
+
+    def handle_thread_details(self, record):
+        for rec in record['details']:
+            self.details[rec['num']] = rec
+        # Keep the cursor on the same thread.
+        row = self.buffer.document.cursor_position_row
+        self._render(self.rows[row] if row < len(self.rows) else None)
+
+    def _render(self, cursor_num):
         lines = []
-        p = compile('(\d+)\s+Thread (.+)(\(.+\))(.+)\s+\(.*\)')
-        for line in output.split('\n'):
-            m = p.search(line)
-            if m:
-                ch = '*' if line.startswith('*') else ' '
-                lines.append('{}{:<3} Thread {}{}{}'.format(ch, m[1], m[2],
-                                                                m[3], m[4]))
-                pat = line.find(' at ', m.lastindex)
-                if pat > 0:
-                    lines.append('    ' + line[pat:])
+        rows = []
+        cursor_line = 0
+        for num in self.nums:
+            if num == cursor_num:
+                cursor_line = len(lines)
+            ch = '*' if num == self.selected else ' '
+            rec = self.details.get(num)
+            if rec:
+                name = ' "%s"' % rec['name'] if rec['name'] else ''
+                func = rec['func']
+            else:
+                (name, func) = ('', '')
+            lines.append('{}{:<3} Thread ({}){} {}'.format(
+                ch, num, self.targets[num], name, func))
+            rows.append(num)
+            if rec and 'line' in rec:
+                lines.append('     at %s:%d' % (rec['file'], rec['line']))
+                rows.append(num)
+        self.rows = rows
 
         if len(lines) > 0:
-            text = '\n'.join(lines)
-            self.buffer.text = text
-            self.buffer.cursor_position = text.find('*')
+            self.buffer.text = '\n'.join(lines)
+            self.buffer.cursor_position = \
+                self.buffer.document.translate_row_col_to_index(
+                    cursor_line, 0)
         else:
-            self.buffer.text = output
+            self.buffer.text = 'No threads.'
 
-        
         self.fit_to_height()
 
+    def shown(self, lineno):
+        # Called as lines are lexed for display. Asks for the details of
+        # the threads on screen, once per render.
+        if lineno >= len(self.rows):
+            return
+        num = self.rows[lineno]
+        if not self.viewport:
+            get_running_loop().call_soon(self._request)
+        self.viewport.add(num)
+        if num not in self.details and num not in self.requested:
+            self.missing = True
 
-
-    
+    def _request(self):
+        if self.missing:
+            self.app.console.send('gdbw-threads ' +
+                                  ' '.join(str(n) for n in sorted(self.viewport)))
+            self.requested.update(self.viewport)
+        self.viewport = set()
+        self.missing = False